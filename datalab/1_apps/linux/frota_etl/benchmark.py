@@ -0,0 +1,155 @@
+# benchmark.py
+"""
+Módulo: Benchmark do ETL
+Objetivo: Gerar planilhas sintéticas no formato de totalorcadofrotas.xlsx e
+medir o ETL completo (ProcessadorExcel + GerenciadorBanco) contra um SQLite
+temporário, com tempo, vazão e memória por etapa.
+
+Uso:
+    python benchmark.py                       # 1k, 10k e 100k linhas
+    python benchmark.py --linhas 1000 1000000 --saida resultado.json
+
+As planilhas geradas ficam em cache no diretório de trabalho (--diretorio)
+e são reaproveitadas entre execuções; cada cenário roda num processo novo
+para que o pico de memória de um não contamine o do outro.
+"""
+
+import sys
+import json
+import random
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List
+from openpyxl import Workbook
+from config import ConfigETL
+from database.operacoes import GerenciadorBanco
+from instrumentacao import MedidorEtapas
+from mapeamento import TABELAS
+from transformador.excel import ProcessadorExcel
+
+TAMANHOS_PADRAO = [1_000, 10_000, 100_000]
+
+# Valores usados nas colunas de texto da planilha sintética
+MODELOS = ['ACCELO 815', 'CARGO 3133 6X4', 'CASE A8800', 'JD 7200J', 'HILUX CD 4X4', 'S10 LS']
+USUARIOS = ['FAZENDA PAU D´ALHO', 'FAZENDA SANTA RITA', 'FAZENDA BOA VISTA', 'OFICINA CENTRAL']
+CLASSES = ['CAMINHOES', 'COLHEDORA', 'TRATORES', 'VEICULOS LEVES', 'PULVERIZADOR']
+MEDIDORES = ['H', 'KM', 'IND']
+
+def colunas_excel() -> Dict[str, str]:
+    """Colunas do Excel declaradas no registro, com o tipo SQL de cada uma"""
+    colunas = {}
+    for tabela in TABELAS.values():
+        for coluna in tabela.colunas:
+            if coluna.origem is not None:
+                colunas.setdefault(coluna.origem, coluna.tipo)
+    return colunas
+
+def _valor(origem: str, tipo: str, posicao: int, sorteio: random.Random):
+    """Valor sintético de uma célula"""
+    if origem == 'Equipamento':
+        return posicao + 1
+    if origem == 'Modelo/Versão':
+        return sorteio.choice(MODELOS)
+    if origem == 'Usuário':
+        return sorteio.choice(USUARIOS)
+    if origem == 'Classe':
+        return sorteio.choice(CLASSES)
+    if origem == 'Medidor':
+        return sorteio.choice(MEDIDORES)
+    if tipo == 'TEXT':
+        return f"{origem} {posicao}"
+    return round(sorteio.uniform(-5_000, 150_000), 2)
+
+def gerar_planilha(caminho: Path, linhas: int, semente: int = 42) -> Path:
+    """
+    Gera uma planilha sintética com todas as colunas lidas pelo ETL
+    Usa o modo write_only do openpyxl para não manter a planilha em memória.
+    """
+    sorteio = random.Random(semente)
+    colunas = colunas_excel()
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet()
+    planilha.append(list(colunas))
+    for posicao in range(linhas):
+        planilha.append([_valor(origem, tipo, posicao, sorteio) for origem, tipo in colunas.items()])
+    livro.save(caminho)
+    return caminho
+
+def executar_cenario(arquivo: Path, linhas: int, tamanho_lote: int) -> Dict:
+    """
+    Executa o ETL completo de uma planilha contra um banco temporário
+    Returns:
+        Dict: Relatório do MedidorEtapas acrescido do tamanho do banco
+    """
+    logger = logging.getLogger('ETL_Frotas_Benchmark')
+    medidor = MedidorEtapas(contexto={'linhas_planilha': linhas})
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho_banco = Path(diretorio) / 'benchmark.db'
+        banco = GerenciadorBanco(caminho_banco, logger, tamanho_lote, medidor)
+        banco.criar_estrutura()
+        dimensoes, fatos = ProcessadorExcel(arquivo, logger, medidor=medidor).executar()
+        banco.carregar_tudo(dimensoes, fatos, incremental=ConfigETL.CARGA_INCREMENTAL)
+        relatorio = medidor.relatorio()
+        relatorio['tamanho_banco_mb'] = round(caminho_banco.stat().st_size / (1024 * 1024), 1)
+    relatorio['linhas'] = linhas
+    return relatorio
+
+def imprimir_resumo(resultados: List[Dict]):
+    """Mostra uma tabela etapa x tamanho com a duração e a memória de cada etapa"""
+    for resultado in resultados:
+        print(
+            f"\n== {resultado['linhas']:,} linhas: {resultado['duracao_total_s']:.2f}s, "
+            f"pico {resultado['pico_rss_mb']} MB, banco {resultado['tamanho_banco_mb']} MB"
+        )
+        print(f"{'etapa':<45}{'linhas':>10}{'segundos':>11}{'linhas/s':>12}{'RSS MB':>9}")
+        for etapa in resultado['etapas']:
+            print(
+                f"{etapa['etapa']:<45}{etapa['linhas']:>10}{etapa['duracao_s']:>11.4f}"
+                f"{etapa['linhas_por_s'] or '-':>12}{etapa['pico_rss_mb'] or '-':>9}"
+            )
+
+def ler_argumentos() -> argparse.Namespace:
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="Benchmark do ETL de frotas com planilhas sintéticas")
+    parser.add_argument(
+        '--linhas', type=int, nargs='+', default=TAMANHOS_PADRAO,
+        help="Quantidades de linhas das planilhas (ex.: 1000 10000 100000 1000000)"
+    )
+    parser.add_argument(
+        '--diretorio', type=Path, default=Path(tempfile.gettempdir()) / 'frota_etl_benchmark',
+        help="Diretório onde as planilhas sintéticas são geradas e reaproveitadas"
+    )
+    parser.add_argument('--tamanho-lote', type=int, default=ConfigETL.TAMANHO_LOTE)
+    parser.add_argument('--saida', type=Path, help="Arquivo JSON com os resultados completos")
+    return parser.parse_args()
+
+def main():
+    """Gera as planilhas que faltam e mede cada cenário"""
+    argumentos = ler_argumentos()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    argumentos.diretorio.mkdir(parents=True, exist_ok=True)
+
+    resultados = []
+    for linhas in argumentos.linhas:
+        arquivo = argumentos.diretorio / f"sintetico_{linhas}.xlsx"
+        if not arquivo.exists():
+            print(f"Gerando {arquivo} ...", flush=True)
+            inicio = perf_counter()
+            gerar_planilha(arquivo, linhas)
+            print(f"  gerada em {perf_counter() - inicio:.1f}s", flush=True)
+        # Processo novo por cenário: o pico de RSS é do processo inteiro
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            resultados.append(pool.submit(executar_cenario, arquivo, linhas, argumentos.tamanho_lote).result())
+
+    imprimir_resumo(resultados)
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {argumentos.saida}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,6 +15,7 @@ class ConfigETL:
     DIRETORIO_LOGS = DIRETORIO_BASE / 'logs'
     ARQUIVO_LOG = DIRETORIO_LOGS / 'etl_log.log'
     ARQUIVO_DADOS = DIRETORIO_BASE / 'totalorcadofrotas.xlsx'  # Adicionado
+    DIRETORIO_STAGING = DIRETORIO_BASE / 'staging'  # Parquet por hash da planilha
 
     
     # Configurações de Negócio
@@ -23,4 +24,6 @@ class ConfigETL:
     
     # Configurações de Banco
     NOME_BANCO = 'frota.db'
-    TAMANHO_LOTE = 1000
\ No newline at end of file
+    TAMANHO_LOTE = 1000
+    CARGA_INCREMENTAL = True  # Upsert por (id_equipamento, data_referencia)
+    USAR_STAGING = True  # Reaproveita o Parquet quando a planilha não mudou
\ No newline at end of file
@@ -4,111 +4,164 @@ Módulo: Esquema do Banco de Dados
 Objetivo: Definir estrutura dimensional do banco de dados SQLite
 """
 
+from mapeamento import TABELAS
+
 class EsquemaDimensional:
-    """Define estrutura de tabelas do banco de dados"""
+    """Define estrutura de tabelas do banco de dados a partir do registro de mapeamentos"""
     
-    # Dimensão Equipamento
-    SQL_CRIAR_DIM_EQUIPAMENTO = """
-    CREATE TABLE IF NOT EXISTS dim_equipamento (
-        id_equipamento INTEGER PRIMARY KEY,
-        modelo TEXT NOT NULL,
-        usuario TEXT NOT NULL,
-        classe TEXT NOT NULL,
-        data_criacao DATETIME DEFAULT CURRENT_TIMESTAMP
-    )"""
+    # Chave natural de cada tabela, usada para upsert na carga incremental
+    CHAVES_NATURAIS = {nome: list(tabela.chave) for nome, tabela in TABELAS.items()}
     
-    # Fatos de Uso
-    SQL_CRIAR_FATO_USO = """
-    CREATE TABLE IF NOT EXISTS fato_uso (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_equipamento INTEGER,
-        tipo_medidor TEXT CHECK(tipo_medidor IN ('H', 'KM', 'IND')),
-        uso_estimado DECIMAL(15,2),
-        uso_realizado DECIMAL(15,2),
-        uso_diferenca DECIMAL(15,2),
-        data_referencia DATETIME,
-        data_processamento DATETIME,
-        FOREIGN KEY(id_equipamento) REFERENCES dim_equipamento(id_equipamento)
+    # Remove duplicatas herdadas de cargas anteriores, mantendo a mais recente
+    SQL_DEDUPLICAR = """
+    DELETE FROM {tabela}
+    WHERE rowid NOT IN (
+        SELECT MAX(rowid) FROM {tabela} GROUP BY {chave}
     )"""
     
-    # Fatos de Custo Operacional
-    SQL_CRIAR_FATO_CUSTO = """
-    CREATE TABLE IF NOT EXISTS fato_custo (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_equipamento INTEGER,
+    # Índice único que sustenta o ON CONFLICT da carga incremental
+    SQL_CRIAR_CHAVE_NATURAL = """
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_{tabela}_chave
+    ON {tabela} ({chave})"""
+
+    @classmethod
+    def obter_todos_schemas(cls) -> list:
+        """Retorna lista com todos os comandos SQL de criação"""
+        return [tabela.sql_criar for tabela in TABELAS.values()]
+
+class EsquemaAgregado:
+    """Tabelas agregadas mensais mantidas pelo ETL para os dashboards"""
+    
+    # Custo por equipamento e período, com classe/usuário e multiplicadores
+    SQL_CRIAR_AGG_CUSTO_EQUIPAMENTO = """
+    CREATE TABLE IF NOT EXISTS agg_custo_equipamento_mensal (
+        id_equipamento INTEGER NOT NULL,
+        data_referencia DATETIME NOT NULL,
+        classe TEXT,
+        usuario TEXT,
         custo_hora_estimado DECIMAL(15,2),
         custo_hora_realizado DECIMAL(15,2),
         custo_hora_diferenca DECIMAL(15,2),
         total_estimado DECIMAL(15,2),
         total_realizado DECIMAL(15,2),
         total_diferenca DECIMAL(15,2),
-        data_referencia DATETIME,
-        data_processamento DATETIME,
-        FOREIGN KEY(id_equipamento) REFERENCES dim_equipamento(id_equipamento)
+        taxa_utilizacao_multiplicador REAL,
+        consumo_multiplicador REAL,
+        PRIMARY KEY (id_equipamento, data_referencia)
     )"""
     
-    # Fatos de Combustível
-    SQL_CRIAR_FATO_COMBUSTIVEL = """
-    CREATE TABLE IF NOT EXISTS fato_combustivel (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_equipamento INTEGER,
-        comb_litros_estimado DECIMAL(15,2),
-        comb_litros_realizado DECIMAL(15,2),
-        comb_litros_diferenca DECIMAL(15,2),
-        comb_valor_unitario_estimado DECIMAL(15,2),
-        comb_valor_unitario_realizado DECIMAL(15,2),
-        comb_valor_unitario_diferenca DECIMAL(15,2),
-        comb_total_estimado DECIMAL(15,2),
-        comb_total_realizado DECIMAL(15,2),
-        comb_total_diferenca DECIMAL(15,2),
-        data_referencia DATETIME,
-        data_processamento DATETIME,
-        FOREIGN KEY(id_equipamento) REFERENCES dim_equipamento(id_equipamento)
+    # Custo por classe, usuário e período
+    SQL_CRIAR_AGG_CUSTO_CLASSE_USUARIO = """
+    CREATE TABLE IF NOT EXISTS agg_custo_classe_usuario_mensal (
+        classe TEXT NOT NULL,
+        usuario TEXT NOT NULL,
+        data_referencia DATETIME NOT NULL,
+        qtd_equipamentos INTEGER,
+        total_estimado DECIMAL(15,2),
+        total_realizado DECIMAL(15,2),
+        total_diferenca DECIMAL(15,2),
+        consumo_multiplicador REAL,
+        PRIMARY KEY (classe, usuario, data_referencia)
     )"""
     
-    # Fatos de Manutenção
-    SQL_CRIAR_FATO_MANUTENCAO = """
-    CREATE TABLE IF NOT EXISTS fato_manutencao (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_equipamento INTEGER,
-        lubrificantes_estimado DECIMAL(15,2),
-        lubrificantes_realizado DECIMAL(15,2),
-        lubrificantes_diferenca DECIMAL(15,2),
-        filtros_estimado DECIMAL(15,2),
-        filtros_realizado DECIMAL(15,2),
-        filtros_diferenca DECIMAL(15,2),
-        graxas_estimado DECIMAL(15,2),
-        graxas_realizado DECIMAL(15,2),
-        graxas_diferenca DECIMAL(15,2),
-        pecas_servicos_estimado DECIMAL(15,2),
-        pecas_servicos_realizado DECIMAL(15,2),
-        pecas_servicos_diferenca DECIMAL(15,2),
-        data_referencia DATETIME,
-        data_processamento DATETIME,
-        FOREIGN KEY(id_equipamento) REFERENCES dim_equipamento(id_equipamento)
-    )"""
+    SQL_CRIAR_INDICE_AGG_EQUIPAMENTO = """
+    CREATE INDEX IF NOT EXISTS ix_agg_custo_equipamento_mensal_data
+    ON agg_custo_equipamento_mensal (data_referencia, usuario, classe)"""
     
-    # Fatos de Reforma
-    SQL_CRIAR_FATO_REFORMA = """
-    CREATE TABLE IF NOT EXISTS fato_reforma (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_equipamento INTEGER,
-        reforma_estimado DECIMAL(15,2),
-        reforma_realizado DECIMAL(15,2),
-        reforma_diferenca DECIMAL(15,2),
-        data_referencia DATETIME,
-        data_processamento DATETIME,
-        FOREIGN KEY(id_equipamento) REFERENCES dim_equipamento(id_equipamento)
+    # Períodos são passados como um único parâmetro JSON (lista de datas)
+    SQL_LIMPAR_PERIODOS = """
+    DELETE FROM {tabela}
+    WHERE data_referencia IN (SELECT value FROM json_each(?))"""
+    
+    SQL_ATUALIZAR_AGG_CUSTO_EQUIPAMENTO = """
+    INSERT INTO agg_custo_equipamento_mensal
+    SELECT
+        fc.id_equipamento,
+        fc.data_referencia,
+        de.classe,
+        de.usuario,
+        SUM(fc.custo_hora_estimado),
+        SUM(fc.custo_hora_realizado),
+        SUM(fc.custo_hora_diferenca),
+        SUM(fc.total_estimado),
+        SUM(fc.total_realizado),
+        SUM(fc.total_diferenca),
+        CASE WHEN SUM(fc.custo_hora_estimado) != 0
+             THEN SUM(fc.custo_hora_realizado) * 1.0 / SUM(fc.custo_hora_estimado)
+             ELSE 0.0 END,
+        CASE WHEN SUM(fc.total_estimado) != 0
+             THEN SUM(fc.total_realizado) * 1.0 / SUM(fc.total_estimado)
+             ELSE 0.0 END
+    FROM fato_custo AS fc
+    INNER JOIN dim_equipamento AS de
+        ON fc.id_equipamento = de.id_equipamento
+    WHERE fc.data_referencia IN (SELECT value FROM json_each(?))
+    GROUP BY fc.id_equipamento, fc.data_referencia"""
+    
+    # Calculada a partir do agregado por equipamento, já atualizado
+    SQL_ATUALIZAR_AGG_CUSTO_CLASSE_USUARIO = """
+    INSERT INTO agg_custo_classe_usuario_mensal
+    SELECT
+        classe,
+        usuario,
+        data_referencia,
+        COUNT(*),
+        SUM(total_estimado),
+        SUM(total_realizado),
+        SUM(total_diferenca),
+        CASE WHEN SUM(total_estimado) != 0
+             THEN SUM(total_realizado) * 1.0 / SUM(total_estimado)
+             ELSE 0.0 END
+    FROM agg_custo_equipamento_mensal
+    WHERE data_referencia IN (SELECT value FROM json_each(?))
+    GROUP BY classe, usuario, data_referencia"""
+    
+    # Limites de data, contagem e última carga de cada tabela de fatos, lidos
+    # pelos dashboards em vez de MIN/MAX sobre todas as tabelas
+    SQL_CRIAR_META_FATOS = """
+    CREATE TABLE IF NOT EXISTS meta_fatos (
+        tabela TEXT PRIMARY KEY,
+        min_data_referencia DATETIME,
+        max_data_referencia DATETIME,
+        min_data_processamento DATETIME,
+        max_data_processamento DATETIME,
+        qtd_linhas INTEGER NOT NULL,
+        ultima_carga DATETIME NOT NULL
     )"""
+    
+    # O WHERE true evita a ambiguidade do ON CONFLICT após um SELECT
+    SQL_ATUALIZAR_META_FATOS = """
+    INSERT INTO meta_fatos
+    SELECT
+        ?,
+        MIN(data_referencia),
+        MAX(data_referencia),
+        MIN(data_processamento),
+        MAX(data_processamento),
+        COUNT(*),
+        ?
+    FROM {tabela}
+    WHERE true
+    ON CONFLICT(tabela) DO UPDATE SET
+        min_data_referencia = excluded.min_data_referencia,
+        max_data_referencia = excluded.max_data_referencia,
+        min_data_processamento = excluded.min_data_processamento,
+        max_data_processamento = excluded.max_data_processamento,
+        qtd_linhas = excluded.qtd_linhas,
+        ultima_carga = excluded.ultima_carga"""
+    
+    # Ordem de atualização: o agregado por classe depende do por equipamento
+    ATUALIZACOES = [
+        ('agg_custo_equipamento_mensal', SQL_ATUALIZAR_AGG_CUSTO_EQUIPAMENTO),
+        ('agg_custo_classe_usuario_mensal', SQL_ATUALIZAR_AGG_CUSTO_CLASSE_USUARIO)
+    ]
 
     @classmethod
     def obter_todos_schemas(cls) -> list:
         """Retorna lista com todos os comandos SQL de criação"""
         return [
-            cls.SQL_CRIAR_DIM_EQUIPAMENTO,
-            cls.SQL_CRIAR_FATO_USO,
-            cls.SQL_CRIAR_FATO_CUSTO,
-            cls.SQL_CRIAR_FATO_COMBUSTIVEL,
-            cls.SQL_CRIAR_FATO_MANUTENCAO,
-            cls.SQL_CRIAR_FATO_REFORMA
+            cls.SQL_CRIAR_AGG_CUSTO_EQUIPAMENTO,
+            cls.SQL_CRIAR_AGG_CUSTO_CLASSE_USUARIO,
+            cls.SQL_CRIAR_INDICE_AGG_EQUIPAMENTO,
+            cls.SQL_CRIAR_META_FATOS
         ]
\ No newline at end of file
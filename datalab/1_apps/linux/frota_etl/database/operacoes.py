@@ -5,25 +5,52 @@ Objetivo: Gerenciar operações de banco de dados SQLite
 """
 
 import sqlite3
+import hashlib
+import json
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 import logging
-from .esquema import EsquemaDimensional
+from typing import Dict, List, Optional, Tuple
+from instrumentacao import MedidorEtapas
+from mapeamento import TABELAS, Tabela
+from .esquema import EsquemaAgregado, EsquemaDimensional
 
 class GerenciadorBanco:
     """Gerencia operações no banco SQLite"""
     
-    def __init__(self, nome_banco: str, logger: logging.Logger):
+    # PRAGMAs da conexão de carga em lote; os de conexão (synchronous,
+    # cache_size, temp_store) valem só até ela ser fechada, enquanto o
+    # journal_mode WAL fica gravado no arquivo e também vale para os leitores
+    PRAGMAS_CARGA = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = OFF",
+        "PRAGMA cache_size = -65536",  # ~64 MB
+        "PRAGMA temp_store = MEMORY"
+    ]
+    
+    # Estatísticas do otimizador recalculadas após cada carga
+    PRAGMAS_ANALISE = [
+        "PRAGMA analysis_limit = 1000",
+        "ANALYZE"
+    ]
+    
+    def __init__(self, nome_banco: str, logger: logging.Logger, tamanho_lote: int = 1000,
+                 medidor: Optional[MedidorEtapas] = None):
         self.caminho_banco = Path(nome_banco)
         self.logger = logger
+        self.tamanho_lote = tamanho_lote
+        self.medidor = medidor or MedidorEtapas()
         self.conn = None
         self.cursor = None
+        self.em_carga = False
     
     def conectar(self):
         """Estabelece conexão com o banco"""
         try:
-            self.conn = sqlite3.connect(self.caminho_banco)
-            self.cursor = self.conn.cursor()
+            with self.medidor.etapa('conexao'):
+                self.conn = sqlite3.connect(self.caminho_banco)
+                self.cursor = self.conn.cursor()
             self.logger.info(f"Conexão estabelecida com {self.caminho_banco}")
         except Exception as e:
             self.logger.error(f"Erro ao conectar ao banco: {str(e)}")
@@ -35,6 +62,9 @@ class GerenciadorBanco:
             self.conectar()
             for comando_sql in EsquemaDimensional.obter_todos_schemas():
                 self.cursor.execute(comando_sql)
+            for comando_sql in EsquemaAgregado.obter_todos_schemas():
+                self.cursor.execute(comando_sql)
+            self._migrar_estrutura()
             self.conn.commit()
             self.logger.info("Estrutura do banco criada com sucesso")
         except Exception as e:
@@ -43,35 +73,254 @@ class GerenciadorBanco:
         finally:
             self.desconectar()
     
-    def inserir_lote(self, tabela: str, dados: list):
-        """Insere lote de dados em uma tabela garantindo valores nulos tratados"""
-        try:
-            self.conectar()
-            if not dados:
-                self.logger.warning(f"Nenhum dado disponível para inserir em {tabela}")
-                return
+    def _migrar_estrutura(self):
+        """Adapta bancos criados por versões anteriores: hash, chave natural e índices"""
+        for tabela, chave in EsquemaDimensional.CHAVES_NATURAIS.items():
+            colunas = {linha[1] for linha in self.cursor.execute(f"PRAGMA table_info({tabela})")}
+            if 'hash_linha' not in colunas:
+                self.cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN hash_linha TEXT")
+                self.logger.info(f"Coluna hash_linha adicionada em {tabela}")
 
-            # Garante que todas as colunas esperadas estejam presentes
-            colunas = ', '.join(dados[0].keys())
-            placeholders = ', '.join(['?' for _ in dados[0].values()])
-            
-            # Substituir valores None por 0 antes da inserção
-            dados_processados = [tuple(d.values()) for d in dados]
+            indices = {linha[1] for linha in self.cursor.execute(f"PRAGMA index_list({tabela})")}
+            if f"ux_{tabela}_chave" not in indices:
+                parametros = {'tabela': tabela, 'chave': ', '.join(chave)}
+                self.cursor.execute(EsquemaDimensional.SQL_DEDUPLICAR.format(**parametros))
+                if self.cursor.rowcount > 0:
+                    self.logger.warning(f"Removidas {self.cursor.rowcount} linhas duplicadas de {tabela}")
+                self.cursor.execute(EsquemaDimensional.SQL_CRIAR_CHAVE_NATURAL.format(**parametros))
 
-            self.cursor.executemany(
-                f"INSERT INTO {tabela} ({colunas}) VALUES ({placeholders})",  
-                dados_processados
-            )
+            self._migrar_indices(TABELAS[tabela])
+    
+    def _migrar_indices(self, tabela: Tabela):
+        """Cria os índices declarados e recria os que mudaram de colunas"""
+        for indice in tabela.indices:
+            existentes = [linha[2] for linha in self.cursor.execute(f"PRAGMA index_info({indice.nome})")]
+            if existentes and tuple(existentes) != indice.colunas:
+                self.cursor.execute(f"DROP INDEX {indice.nome}")
+                self.logger.info(f"Índice {indice.nome} será recriado com novas colunas")
+            if tuple(existentes) != indice.colunas:
+                self.cursor.execute(tabela.sql_indices[indice.nome])
+                self.logger.info(f"Índice {indice.nome} criado em {tabela.nome}")
+    
+    def inserir_lote(self, tabela: str, colunas: List[str], linhas: List[tuple]) -> int:
+        """
+        Insere lote de linhas (tuplas na ordem de colunas) em uma tabela
+        Dentro de carga_em_lote reutiliza a conexão e a transação abertas;
+        fora dela abre uma conexão própria e confirma ao final.
+        Returns:
+            int: Quantidade de linhas gravadas
+        """
+        if self.em_carga:
+            return self._medir_carga(self._inserir_em_blocos, tabela, colunas, linhas)
+        try:
+            self.conectar()
+            gravadas = self._medir_carga(self._inserir_em_blocos, tabela, colunas, linhas)
             self.conn.commit()
-            self.logger.info(f"Inseridos {len(dados)} registros em {tabela}")
+            return gravadas
         except Exception as e:
             self.logger.error(f"Erro ao inserir lote em {tabela}: {str(e)}")
             raise
         finally:
             self.desconectar()
     
+    def upsert_lote(self, tabela: str, colunas: List[str], linhas: List[tuple]) -> int:
+        """
+        Carga incremental e idempotente de uma tabela
+        Linhas cujo hash coincide com o já gravado para a mesma chave natural
+        são ignoradas; as demais são inseridas ou atualizadas via ON CONFLICT.
+        Returns:
+            int: Quantidade de linhas inseridas ou atualizadas
+        """
+        if self.em_carga:
+            return self._medir_carga(self._upsert_em_blocos, tabela, colunas, linhas)
+        try:
+            self.conectar()
+            gravadas = self._medir_carga(self._upsert_em_blocos, tabela, colunas, linhas)
+            self.conn.commit()
+            return gravadas
+        except Exception as e:
+            self.logger.error(f"Erro no upsert em {tabela}: {str(e)}")
+            raise
+        finally:
+            self.desconectar()
+    
+    def carregar_tudo(self, dimensoes: Dict[str, Tuple[List[str], List[tuple]]],
+                      fatos: Dict[str, Tuple[List[str], List[tuple]]],
+                      incremental: bool = False, analisar: bool = True):
+        """Carrega dimensões e fatos em uma única conexão e transação"""
+        carregar = self.upsert_lote if incremental else self.inserir_lote
+        with self.carga_em_lote(analisar):
+            dimensoes_alteradas = 0
+            for nome_tabela, (colunas, linhas) in dimensoes.items():
+                dimensoes_alteradas += carregar(nome_tabela, colunas, linhas)
+
+            periodos = set()
+            for nome_tabela, (colunas, linhas) in fatos.items():
+                if carregar(nome_tabela, colunas, linhas) and nome_tabela == 'fato_custo':
+                    posicao = colunas.index('data_referencia')
+                    periodos.update(linha[posicao] for linha in linhas)
+
+            # Mudança de classe/usuário afeta os agregados de todo o histórico
+            if dimensoes_alteradas:
+                periodos.update(
+                    linha[0] for linha in
+                    self.cursor.execute("SELECT DISTINCT data_referencia FROM fato_custo")
+                )
+            self.atualizar_agregados(sorted(periodos))
+            self.atualizar_metadados()
+    
+    def atualizar_agregados(self, periodos: List[str]):
+        """Recalcula as tabelas agregadas somente para os períodos informados"""
+        if not periodos:
+            self.logger.info("Agregados sem alteração")
+            return
+        parametro = json.dumps(periodos)
+        for tabela, comando_sql in EsquemaAgregado.ATUALIZACOES:
+            with self.medidor.etapa(f"agregado:{tabela}") as etapa:
+                self.cursor.execute(EsquemaAgregado.SQL_LIMPAR_PERIODOS.format(tabela=tabela), (parametro,))
+                self.cursor.execute(comando_sql, (parametro,))
+                etapa['linhas'] = self.cursor.rowcount
+            self.logger.info(f"Agregado {tabela} atualizado para {len(periodos)} período(s)")
+    
+    def atualizar_metadados(self):
+        """
+        Atualiza meta_fatos com os limites de data, a contagem e o horário
+        da carga de cada tabela de fatos, na transação da carga
+        """
+        ultima_carga = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.medidor.etapa('metadados') as etapa:
+            tabelas = [tabela.nome for tabela in TABELAS.values() if not tabela.dimensao]
+            for tabela in tabelas:
+                self.cursor.execute(
+                    EsquemaAgregado.SQL_ATUALIZAR_META_FATOS.format(tabela=tabela),
+                    (tabela, ultima_carga)
+                )
+            etapa['linhas'] = len(tabelas)
+        self.logger.info(f"Metadados de {len(tabelas)} tabela(s) de fatos atualizados")
+    
+    @contextmanager
+    def carga_em_lote(self, analisar: bool = True):
+        """
+        Abre uma conexão com PRAGMAs de carga e uma única transação
+        Qualquer erro antes da confirmação desfaz a carga inteira. Com
+        analisar, as estatísticas do otimizador são recalculadas após a
+        confirmação; uma falha nessa etapa não invalida a carga já gravada.
+        """
+        self.conectar()
+        try:
+            try:
+                for pragma in self.PRAGMAS_CARGA:
+                    self.cursor.execute(pragma)
+                self.cursor.execute("BEGIN")
+                self.em_carga = True
+                yield self
+                with self.medidor.etapa('commit'):
+                    self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                self.logger.error(f"Erro na carga em lote, transação desfeita: {str(e)}")
+                raise
+            finally:
+                self.em_carga = False
+            self.logger.info("Carga em lote confirmada")
+            if analisar:
+                try:
+                    self._analisar()
+                except Exception as e:
+                    self.logger.warning(f"Carga confirmada, mas a atualização das estatísticas falhou: {str(e)}")
+        finally:
+            self.desconectar()
+    
+    def analisar(self):
+        """Recalcula as estatísticas do otimizador em conexão própria"""
+        try:
+            self.conectar()
+            self._analisar()
+        finally:
+            self.desconectar()
+    
+    def _analisar(self):
+        """Executa ANALYZE na conexão aberta"""
+        with self.medidor.etapa('analise'):
+            for pragma in self.PRAGMAS_ANALISE:
+                self.cursor.execute(pragma)
+            self.conn.commit()
+        self.logger.info("Estatísticas do banco atualizadas")
+    
+    def _medir_carga(self, carregar, tabela: str, colunas: List[str], linhas: List[tuple]) -> int:
+        """Executa a carga de uma tabela registrando-a como etapa"""
+        with self.medidor.etapa(f"carga:{tabela}", len(linhas)) as etapa:
+            gravadas = carregar(tabela, colunas, linhas)
+            etapa['gravadas'] = gravadas
+        return gravadas
+    
+    def _inserir_em_blocos(self, tabela: str, colunas: List[str], linhas: List[tuple]) -> int:
+        """Executa executemany em blocos de tamanho_lote registros"""
+        if not linhas:
+            self.logger.warning(f"Nenhum dado disponível para inserir em {tabela}")
+            return 0
+
+        definicao = self._definicao(tabela, colunas)
+        for inicio in range(0, len(linhas), self.tamanho_lote):
+            self.cursor.executemany(definicao.sql_inserir, linhas[inicio:inicio + self.tamanho_lote])
+        self.logger.info(f"Inseridos {len(linhas)} registros em {tabela}")
+        return len(linhas)
+    
+    def _upsert_em_blocos(self, tabela: str, colunas: List[str], linhas: List[tuple]) -> int:
+        """Filtra linhas inalteradas pelo hash e aplica upsert no restante"""
+        if not linhas:
+            self.logger.warning(f"Nenhum dado disponível para inserir em {tabela}")
+            return 0
+
+        definicao = self._definicao(tabela, colunas)
+        posicoes_chave = definicao.posicoes_chave
+        posicoes_hash = definicao.posicoes_hash
+        hashes_existentes = self._carregar_hashes(definicao, linhas)
+
+        alteradas = []
+        for linha in linhas:
+            hash_linha = self._calcular_hash(linha[i] for i in posicoes_hash)
+            if hashes_existentes.get(tuple(linha[i] for i in posicoes_chave)) != hash_linha:
+                alteradas.append((*linha, hash_linha))
+
+        ignoradas = len(linhas) - len(alteradas)
+        for inicio in range(0, len(alteradas), self.tamanho_lote):
+            self.cursor.executemany(definicao.sql_upsert, alteradas[inicio:inicio + self.tamanho_lote])
+        self.logger.info(
+            f"Gravados {len(alteradas)} registros em {tabela} ({ignoradas} sem alteração)"
+        )
+        return len(alteradas)
+    
+    @staticmethod
+    def _definicao(tabela: str, colunas: List[str]) -> Tabela:
+        """Obtém a tabela do registro, conferindo a ordem das colunas recebidas"""
+        definicao = TABELAS[tabela]
+        if tuple(colunas) != definicao.colunas_carga:
+            raise ValueError(
+                f"Colunas recebidas para {tabela} não correspondem ao registro: {colunas}"
+            )
+        return definicao
+    
+    def _carregar_hashes(self, definicao: Tabela, linhas: List[tuple]) -> Dict[tuple, str]:
+        """Lê os hashes já gravados, restritos aos períodos presentes no lote"""
+        consulta = f"SELECT {', '.join(definicao.chave)}, hash_linha FROM {definicao.nome}"
+        parametros = []
+        if 'data_referencia' in definicao.chave:
+            posicao = definicao.colunas_carga.index('data_referencia')
+            parametros = sorted({linha[posicao] for linha in linhas})
+            consulta += f" WHERE data_referencia IN ({', '.join('?' for _ in parametros)})"
+        self.cursor.execute(consulta, parametros)
+        return {tuple(linha[:-1]): linha[-1] for linha in self.cursor.fetchall()}
+    
+    @staticmethod
+    def _calcular_hash(valores) -> str:
+        """Hash estável do conteúdo de negócio de uma linha"""
+        return hashlib.blake2b(repr(tuple(valores)).encode('utf-8'), digest_size=16).hexdigest()
+    
     def desconectar(self):
         """Encerra conexão com o banco"""
         if self.conn:
             self.conn.close()
+            self.conn = None
+            self.cursor = None
             self.logger.info("Conexão com banco encerrada")
\ No newline at end of file
@@ -0,0 +1,80 @@
+# instrumentacao.py
+"""
+Módulo: Instrumentação do ETL
+Objetivo: Medir tempo, vazão (linhas/s) e pico de memória de cada etapa do
+ETL e gravar um relatório JSON por execução, para acompanhar regressões à
+medida que as planilhas crescem.
+"""
+
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def pico_rss_mb() -> Optional[float]:
+    """Pico de memória residente do processo atual, em MB"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(pico / divisor, 1)
+
+class MedidorEtapas:
+    """Registra as etapas de uma execução do ETL"""
+
+    def __init__(self, contexto: Optional[Dict] = None):
+        self.inicio = datetime.now()
+        self.contexto = contexto or {}
+        self.etapas: List[Dict] = []
+
+    @contextmanager
+    def etapa(self, nome: str, linhas: int = 0):
+        """
+        Mede uma etapa. O registro entregue pelo with pode ter 'linhas'
+        atualizado quando a quantidade só é conhecida ao final.
+        """
+        registro = {**self.contexto, 'etapa': nome, 'linhas': linhas}
+        inicio = perf_counter()
+        try:
+            yield registro
+        finally:
+            duracao = perf_counter() - inicio
+            registro['duracao_s'] = round(duracao, 4)
+            registro['linhas_por_s'] = round(registro['linhas'] / duracao) if duracao and registro['linhas'] else None
+            registro['pico_rss_mb'] = pico_rss_mb()
+            self.etapas.append(registro)
+
+    def incorporar(self, etapas: List[Dict]):
+        """Acrescenta etapas medidas em outro processo (modo lote)"""
+        self.etapas.extend(etapas)
+
+    def relatorio(self) -> Dict:
+        """Resumo da execução com todas as etapas"""
+        picos = [e['pico_rss_mb'] for e in self.etapas if e.get('pico_rss_mb') is not None]
+        return {
+            'inicio': self.inicio.strftime("%Y-%m-%d %H:%M:%S"),
+            'duracao_total_s': round((datetime.now() - self.inicio).total_seconds(), 4),
+            'pico_rss_mb': max(picos) if picos else None,
+            'etapas': self.etapas
+        }
+
+    def salvar_relatorio(self, diretorio: Path) -> Path:
+        """
+        Grava o relatório JSON no diretório de logs. O nome leva milissegundos e
+        o PID para que execuções no mesmo segundo não sobrescrevam o relatório.
+        """
+        carimbo = self.inicio.strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        arquivo = Path(diretorio) / f"etl_relatorio_{carimbo}_{os.getpid()}.json"
+        with open(arquivo, 'w', encoding='utf-8') as f:
+            json.dump(self.relatorio(), f, ensure_ascii=False, indent=2)
+        return arquivo
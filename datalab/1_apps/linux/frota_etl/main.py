@@ -6,13 +6,24 @@ Autor: Claude
 Data: 01/02/2025
 """
 
+import os
 import sys
+import re
+import glob
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
+from typing import List, Optional
 import logging
 from config import ConfigETL
 from transformador.excel import ProcessadorExcel
 from database.operacoes import GerenciadorBanco
+from instrumentacao import MedidorEtapas
+from transformador.staging import PARQUET_DISPONIVEL, StagingParquet
 
 def configurar_ambiente() -> tuple:
     """
@@ -47,36 +58,192 @@ def executar_etl(arquivo: str, config: ConfigETL, logger: logging.Logger) -> boo
     """
     try:
         logger.info(f"Iniciando ETL - Arquivo: {arquivo}")
+        medidor = MedidorEtapas(contexto={'arquivo': Path(arquivo).name})
         
         # Inicializa banco de dados
-        banco = GerenciadorBanco(config.NOME_BANCO, logger)
+        banco = GerenciadorBanco(config.NOME_BANCO, logger, config.TAMANHO_LOTE, medidor)
         banco.criar_estrutura()
         
-        # Processa dados
-        processador = ProcessadorExcel(arquivo, logger)
+        # Processa dados (ou reaproveita o staging da mesma planilha)
+        staging = criar_staging(config.DIRETORIO_STAGING if config.USAR_STAGING else None, logger)
+        processador = ProcessadorExcel(arquivo, logger, medidor=medidor, staging=staging)
         dimensoes, fatos = processador.executar()
         
-        # Carrega dimensões
-        for nome_tabela, dados in dimensoes.items():
-            banco.inserir_lote(nome_tabela, dados)
-        
-        # Carrega fatos
-        for nome_tabela, dados in fatos.items():
-            banco.inserir_lote(nome_tabela, dados)
+        # Carrega dimensões e fatos em uma única transação
+        banco.carregar_tudo(dimensoes, fatos, incremental=config.CARGA_INCREMENTAL)
         
         logger.info("Processo ETL concluído com sucesso")
+        salvar_relatorio(medidor, config, logger)
         return True
         
     except Exception as e:
         logger.error(f"Erro fatal no processo ETL: {str(e)}")
         return False
 
+def criar_staging(diretorio: Optional[Path], logger: logging.Logger) -> Optional[StagingParquet]:
+    """
+    Área de staging em Parquet, se habilitada e com pyarrow instalado
+    Returns:
+        StagingParquet: Staging a usar, ou None para ler sempre o Excel
+    """
+    if diretorio is None:
+        return None
+    if not PARQUET_DISPONIVEL:
+        logger.warning("pyarrow não instalado; staging em Parquet desabilitado")
+        return None
+    return StagingParquet(diretorio, logger)
+
+def salvar_relatorio(medidor: MedidorEtapas, config: ConfigETL, logger: logging.Logger):
+    """Grava o relatório de etapas ao lado do log; falhas aqui não derrubam o ETL"""
+    try:
+        caminho = medidor.salvar_relatorio(config.DIRETORIO_LOGS)
+        logger.info(f"Relatório de desempenho gravado em {caminho}")
+    except Exception as e:
+        logger.warning(f"Não foi possível gravar o relatório de desempenho: {str(e)}")
+
+def inferir_data_referencia(arquivo: Path) -> Optional[datetime]:
+    """
+    Extrai o mês de referência do nome do arquivo (ex.: orcado_2025-04.xlsx,
+    orcado_202504.xlsx)
+    Returns:
+        datetime: Primeiro dia do mês, ou None se o nome não contiver AAAA-MM
+    """
+    encontrado = re.search(r'(20\d{2})[-_.]?(0[1-9]|1[0-2])', Path(arquivo).stem)
+    if not encontrado:
+        return None
+    return datetime(int(encontrado.group(1)), int(encontrado.group(2)), 1)
+
+def processar_arquivo(arquivo: Path, diretorio_staging: Optional[Path] = None) -> tuple:
+    """
+    Lê e transforma um arquivo; executada nos processos do pool
+    Returns:
+        tuple: Dimensões, fatos e etapas medidas na leitura
+    """
+    logger = logging.getLogger('ETL_Frotas')
+    medidor = MedidorEtapas(contexto={'arquivo': arquivo.name})
+    data_referencia = inferir_data_referencia(arquivo)
+    if data_referencia is None:
+        logger.warning(f"Mês de referência não identificado no nome de {arquivo}; usando o padrão")
+    staging = criar_staging(diretorio_staging, logger)
+    dimensoes, fatos = ProcessadorExcel(arquivo, logger, data_referencia, medidor, staging).executar()
+    return dimensoes, fatos, medidor.etapas
+
+def listar_arquivos(origem: str) -> List[Path]:
+    """Lista as planilhas de um diretório ou de um padrão glob, em ordem de nome"""
+    caminho = Path(origem)
+    candidatos = caminho.glob('*.xlsx') if caminho.is_dir() else map(Path, glob.glob(origem))
+    # Ignora arquivos de trava criados pelo Excel/LibreOffice
+    return sorted(
+        a for a in candidatos
+        if a.is_file() and not a.name.startswith(('~$', '.~lock'))
+    )
+
+def executar_lote(arquivos: List[Path], config: ConfigETL, logger: logging.Logger,
+                  processos: Optional[int] = None) -> bool:
+    """
+    Executa ETL de várias planilhas
+    A leitura do Excel (CPU) roda em paralelo num pool de processos; a gravação
+    fica num único escritor, no processo principal, com uma transação por
+    arquivo, em ordem de mês de referência (inferir_data_referencia; arquivos
+    sem mês no nome vão por último), para que a dimensão termine com o mês mais
+    recente. Só há 'processos' planilhas em andamento por vez, para que os
+    resultados lidos e ainda não gravados não se acumulem na memória.
+    Args:
+        arquivos: Planilhas a carregar
+        config: Configurações do sistema
+        logger: Logger configurado
+        processos: Tamanho do pool (padrão: núcleos disponíveis)
+    Returns:
+        bool: True se todos os arquivos foram carregados
+    """
+    arquivos = sorted(arquivos, key=lambda arquivo: (inferir_data_referencia(arquivo) or datetime.max, arquivo.name))
+    logger.info(f"Iniciando ETL em lote - {len(arquivos)} arquivo(s)")
+    inicio = time.perf_counter()
+    total_linhas = 0
+    falhas = []
+
+    medidor = MedidorEtapas()
+    banco = GerenciadorBanco(config.NOME_BANCO, logger, config.TAMANHO_LOTE, medidor)
+    banco.criar_estrutura()
+
+    limite = processos or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=limite) as pool:
+        diretorio_staging = config.DIRETORIO_STAGING if config.USAR_STAGING else None
+        pendentes = iter(arquivos)
+        em_andamento = deque(
+            (arquivo, pool.submit(processar_arquivo, arquivo, diretorio_staging))
+            for arquivo in islice(pendentes, limite)
+        )
+        posicao = 0
+        while em_andamento:
+            arquivo, futuro = em_andamento.popleft()
+            posicao += 1
+            # O processo liberado já recebe a próxima planilha enquanto esta é gravada
+            wait([futuro])
+            proximo = next(pendentes, None)
+            if proximo is not None:
+                em_andamento.append((proximo, pool.submit(processar_arquivo, proximo, diretorio_staging)))
+            try:
+                dimensoes, fatos, etapas = futuro.result()
+                medidor.incorporar(etapas)
+                medidor.contexto = {'arquivo': arquivo.name}
+                inicio_carga = time.perf_counter()
+                # Em lote a carga é sempre incremental: equipamentos se repetem entre meses
+                banco.carregar_tudo(dimensoes, fatos, incremental=True, analisar=False)
+                linhas = sum(len(linhas) for _, linhas in fatos.values())
+                total_linhas += linhas
+                logger.info(
+                    f"[{posicao}/{len(arquivos)}] {arquivo.name}: {linhas} linhas de fatos "
+                    f"carregadas em {time.perf_counter() - inicio_carga:.2f}s"
+                )
+            except Exception as e:
+                falhas.append(arquivo)
+                logger.error(f"[{posicao}/{len(arquivos)}] Falha em {arquivo.name}: {str(e)}")
+
+    if len(falhas) < len(arquivos):
+        medidor.contexto = {}
+        banco.analisar()
+
+    duracao = time.perf_counter() - inicio
+    logger.info(
+        f"Resumo do lote: {len(arquivos) - len(falhas)}/{len(arquivos)} arquivos, "
+        f"{total_linhas} linhas de fatos em {duracao:.2f}s "
+        f"({total_linhas / duracao if duracao else 0:.0f} linhas/s)"
+    )
+    for arquivo in falhas:
+        logger.error(f"Arquivo não carregado: {arquivo}")
+    salvar_relatorio(medidor, config, logger)
+    return not falhas
+
+def ler_argumentos() -> argparse.Namespace:
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description="ETL de orçamentos de frotas para o banco dimensional")
+    parser.add_argument(
+        '--lote',
+        help="Diretório ou padrão glob (entre aspas) de planilhas mensais a carregar"
+    )
+    parser.add_argument(
+        '--processos', type=int, default=None,
+        help="Processos de leitura em paralelo no modo lote (padrão: núcleos disponíveis)"
+    )
+    return parser.parse_args()
+
 def main():
     """Função principal de execução"""
     try:
         # Configuração inicial
+        argumentos = ler_argumentos()
         config, logger = configurar_ambiente()
         
+        # Modo lote: várias planilhas
+        if argumentos.lote:
+            arquivos = listar_arquivos(argumentos.lote)
+            if not arquivos:
+                logger.error(f"Nenhuma planilha encontrada em: {argumentos.lote}")
+                sys.exit(1)
+            sucesso = executar_lote(arquivos, config, logger, argumentos.processos)
+            sys.exit(0 if sucesso else 1)
+        
         # Verifica arquivo de entrada
         if not config.ARQUIVO_DADOS.exists():
             logger.error(f"Arquivo não encontrado: {config.ARQUIVO_DADOS}")
@@ -0,0 +1,213 @@
+# mapeamento.py
+"""
+Módulo: Registro de Mapeamentos
+Objetivo: Declarar em um único lugar as tabelas do banco dimensional, suas
+colunas e a origem de cada coluna no Excel. O esquema (DDL), a projeção do
+transformador e os comandos de carga são todos gerados a partir daqui.
+"""
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, Optional, Tuple
+
+# Tipo SQL usado nas medidas monetárias e de uso
+DECIMAL = 'DECIMAL(15,2)'
+
+@dataclass(frozen=True)
+class Coluna:
+    """Coluna de uma tabela do banco"""
+    nome: str
+    tipo: str
+    origem: Optional[str] = None  # Coluna correspondente no Excel
+    gerada: bool = False          # Preenchida pelo transformador (datas de controle)
+    restricao: str = ''
+
+    @property
+    def carregada(self) -> bool:
+        """Indica se a coluna faz parte das linhas entregues ao carregador"""
+        return self.origem is not None or self.gerada
+
+@dataclass(frozen=True)
+class Indice:
+    """Índice secundário de uma tabela"""
+    nome: str
+    colunas: Tuple[str, ...]
+
+@dataclass(frozen=True)
+class Tabela:
+    """Tabela do banco dimensional e seus comandos SQL derivados"""
+    nome: str
+    colunas: Tuple[Coluna, ...]
+    chave: Tuple[str, ...]
+    dimensao: bool = False
+    restricoes: Tuple[str, ...] = field(default=())
+    indices: Tuple[Indice, ...] = field(default=())
+
+    @cached_property
+    def colunas_carga(self) -> Tuple[str, ...]:
+        """Colunas na ordem das tuplas produzidas pelo transformador"""
+        return tuple(c.nome for c in self.colunas if c.carregada)
+
+    @cached_property
+    def mapeamento_excel(self) -> Dict[str, str]:
+        """Mapeamento coluna do Excel -> coluna do banco"""
+        return {c.origem: c.nome for c in self.colunas if c.origem is not None}
+
+    @cached_property
+    def sql_criar(self) -> str:
+        """Comando CREATE TABLE"""
+        definicoes = [
+            f"{c.nome} {c.tipo} {c.restricao}".rstrip() for c in self.colunas
+        ] + list(self.restricoes)
+        corpo = ',\n        '.join(definicoes)
+        return f"""
+    CREATE TABLE IF NOT EXISTS {self.nome} (
+        {corpo}
+    )"""
+
+    @cached_property
+    def sql_indices(self) -> Dict[str, str]:
+        """Comandos CREATE INDEX por nome de índice"""
+        return {
+            indice.nome: (
+                f"CREATE INDEX IF NOT EXISTS {indice.nome} "
+                f"ON {self.nome} ({', '.join(indice.colunas)})"
+            )
+            for indice in self.indices
+        }
+
+    @cached_property
+    def sql_inserir(self) -> str:
+        """INSERT simples das colunas de carga"""
+        placeholders = ', '.join('?' for _ in self.colunas_carga)
+        return f"INSERT INTO {self.nome} ({', '.join(self.colunas_carga)}) VALUES ({placeholders})"
+
+    @cached_property
+    def sql_upsert(self) -> str:
+        """INSERT ... ON CONFLICT das colunas de carga acrescidas de hash_linha"""
+        colunas = self.colunas_carga + ('hash_linha',)
+        atualizaveis = [
+            c for c in colunas
+            if c not in self.chave and c not in COLUNAS_PRESERVADAS
+        ]
+        return (
+            f"INSERT INTO {self.nome} ({', '.join(colunas)}) "
+            f"VALUES ({', '.join('?' for _ in colunas)}) "
+            f"ON CONFLICT({', '.join(self.chave)}) DO UPDATE SET "
+            + ', '.join(f"{c} = excluded.{c}" for c in atualizaveis)
+        )
+
+    @cached_property
+    def posicoes_chave(self) -> Tuple[int, ...]:
+        """Posições da chave natural nas tuplas de carga"""
+        return tuple(self.colunas_carga.index(c) for c in self.chave)
+
+    @cached_property
+    def posicoes_hash(self) -> Tuple[int, ...]:
+        """Posições das colunas de negócio que compõem o hash da linha"""
+        return tuple(
+            i for i, c in enumerate(self.colunas_carga) if c not in COLUNAS_FORA_DO_HASH
+        )
+
+# Colunas de controle que não participam do hash da linha
+COLUNAS_FORA_DO_HASH = {'data_criacao', 'data_processamento'}
+
+# Colunas mantidas com o valor original quando a linha é atualizada
+COLUNAS_PRESERVADAS = {'data_criacao'}
+
+def _tripla(prefixo: str, origem: str, orcado: str = 'Orçado',
+            realizado: str = 'Realizado') -> Tuple[Coluna, ...]:
+    """Colunas estimado/realizado/diferença de uma categoria do orçamento"""
+    return (
+        Coluna(f"{prefixo}_estimado", DECIMAL, f"{origem} {orcado}"),
+        Coluna(f"{prefixo}_realizado", DECIMAL, f"{origem} {realizado}"),
+        Coluna(f"{prefixo}_diferenca", DECIMAL, f"{origem} Diferença"),
+    )
+
+def _fato(nome: str, *medidas: Coluna, cobertura: Tuple[str, ...] = ()) -> Tabela:
+    """
+    Tabela de fatos com as colunas padrão de chave e controle
+    Todo fato recebe um índice (data_referencia, id_equipamento) para filtros
+    por período; as colunas de cobertura são acrescentadas a ele para que as
+    consultas dos dashboards sejam respondidas só pelo índice.
+    """
+    return Tabela(
+        nome=nome,
+        colunas=(
+            Coluna('id', 'INTEGER', restricao='PRIMARY KEY AUTOINCREMENT'),
+            Coluna('id_equipamento', 'INTEGER', 'Equipamento'),
+            *medidas,
+            Coluna('data_referencia', 'DATETIME', gerada=True),
+            Coluna('data_processamento', 'DATETIME', gerada=True),
+            Coluna('hash_linha', 'TEXT'),
+        ),
+        chave=('id_equipamento', 'data_referencia'),
+        restricoes=('FOREIGN KEY(id_equipamento) REFERENCES dim_equipamento(id_equipamento)',),
+        indices=(Indice(f"ix_{nome}_data", ('data_referencia', 'id_equipamento', *cobertura)),),
+    )
+
+DIM_EQUIPAMENTO = Tabela(
+    nome='dim_equipamento',
+    colunas=(
+        Coluna('id_equipamento', 'INTEGER', 'Equipamento', restricao='PRIMARY KEY'),
+        Coluna('modelo', 'TEXT', 'Modelo/Versão', restricao='NOT NULL'),
+        Coluna('usuario', 'TEXT', 'Usuário', restricao='NOT NULL'),
+        Coluna('classe', 'TEXT', 'Classe', restricao='NOT NULL'),
+        Coluna('data_criacao', 'DATETIME', gerada=True, restricao='DEFAULT CURRENT_TIMESTAMP'),
+        Coluna('hash_linha', 'TEXT'),
+    ),
+    chave=('id_equipamento',),
+    dimensao=True,
+    indices=(
+        Indice('ix_dim_equipamento_usuario', ('usuario', 'classe', 'id_equipamento')),
+        Indice('ix_dim_equipamento_classe', ('classe', 'usuario', 'id_equipamento')),
+    ),
+)
+
+FATO_USO = _fato(
+    'fato_uso',
+    Coluna('tipo_medidor', 'TEXT', 'Medidor', restricao="CHECK(tipo_medidor IN ('H', 'KM', 'IND'))"),
+    *_tripla('uso', 'Uso (km ou hora)', orcado='Estimado'),
+)
+
+FATO_CUSTO = _fato(
+    'fato_custo',
+    *_tripla('custo_hora', 'Custo por Km ou hora'),
+    *_tripla('total', 'Total'),
+    cobertura=(
+        'custo_hora_estimado', 'custo_hora_realizado', 'custo_hora_diferenca',
+        'total_estimado', 'total_realizado', 'total_diferenca',
+    ),
+)
+
+FATO_COMBUSTIVEL = _fato(
+    'fato_combustivel',
+    *_tripla('comb_litros', 'Combustíveis (l)'),
+    *_tripla('comb_valor_unitario', 'VU Combustível'),
+    *_tripla('comb_total', 'Combustíveis'),
+)
+
+FATO_MANUTENCAO = _fato(
+    'fato_manutencao',
+    *_tripla('lubrificantes', 'Lubrificantes'),
+    *_tripla('filtros', 'Filtros'),
+    *_tripla('graxas', 'Graxas'),
+    *_tripla('pecas_servicos', 'Peças, Serviços e Pneus'),
+)
+
+FATO_REFORMA = _fato(
+    'fato_reforma',
+    *_tripla('reforma', 'Reforma', orcado='Orçada', realizado='Realizada'),
+)
+
+# Registro de todas as tabelas, na ordem de criação e carga
+TABELAS: Dict[str, Tabela] = {
+    t.nome: t for t in (
+        DIM_EQUIPAMENTO,
+        FATO_USO,
+        FATO_CUSTO,
+        FATO_COMBUSTIVEL,
+        FATO_MANUTENCAO,
+        FATO_REFORMA,
+    )
+}
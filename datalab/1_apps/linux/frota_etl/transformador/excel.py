@@ -4,226 +4,186 @@ Módulo: Processador de Dados Excel
 Objetivo: Transformar dados do Excel para formato dimensional
 """
 
+import importlib.util
 import pandas as pd
 from pathlib import Path
 import logging
-import numpy as np
 from datetime import datetime
-from decimal import Decimal
-from typing import Dict, List, Tuple
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+from instrumentacao import MedidorEtapas
+from mapeamento import TABELAS
+from transformador.staging import StagingParquet
+
+# Tabela pronta para carga: nomes das colunas e linhas como tuplas
+TabelaCarga = Tuple[List[str], List[tuple]]
+
+# Engine de leitura: calamine (Rust) quando disponível, senão openpyxl
+ENGINE_EXCEL = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
 
 class ProcessadorExcel:
     """Processa arquivo Excel de frotas para formato dimensional"""
     
-    def __init__(self, arquivo: str, logger: logging.Logger):
+    # Tipos forçados na leitura das colunas de identificação, por tipo SQL
+    TIPOS_LEITURA = {'INTEGER': int, 'TEXT': str}
+    
+    def __init__(self, arquivo: str, logger: logging.Logger,
+                 data_referencia: Optional[datetime] = None,
+                 medidor: Optional[MedidorEtapas] = None,
+                 staging: Optional[StagingParquet] = None):
         self.arquivo = Path(arquivo)
         self.logger = logger
+        self.medidor = medidor or MedidorEtapas()
+        self.staging = staging
         self.data_processamento = datetime.now()
-        self.data_referencia = datetime(2024, 4, 1)
+        self.data_referencia = data_referencia or datetime(2024, 4, 1)
     
-    def executar(self) -> Tuple[Dict, List[Dict]]:
+    def executar(self) -> Tuple[Dict[str, TabelaCarga], Dict[str, TabelaCarga]]:
         """
         Executa processamento completo do arquivo
+        Com staging configurado, uma planilha já processada (mesmo hash de
+        conteúdo) é lida do Parquet em vez do Excel.
         Returns:
-            Tuple[Dict, List[Dict]]: Dimensões e fatos processados
+            Tuple[Dict, Dict]: Dimensões e fatos como (colunas, linhas)
         """
         try:
             self.logger.info(f"Iniciando processamento do arquivo: {self.arquivo}")
-            dados = self._ler_arquivo()
-            dimensoes = self._processar_dimensoes(dados)
-            fatos = self._processar_fatos(dados)
+            chave = None
+            if self.staging is not None:
+                with self.medidor.etapa('staging:hash'):
+                    chave = self.staging.chave(self.arquivo)
+                preparado = self._ler_staging(chave)
+                if preparado is not None:
+                    return preparado
+            with self.medidor.etapa('leitura') as etapa:
+                dados = self._ler_arquivo()
+                etapa['linhas'] = len(dados)
+            with self.medidor.etapa('conversao', len(dados)):
+                colunas = self._converter_colunas(dados)
+            del dados
+            dimensoes = self._processar_dimensoes(colunas)
+            fatos = self._processar_fatos(colunas)
+            if chave is not None:
+                self._gravar_staging(chave, {**dimensoes, **fatos})
             return dimensoes, fatos
         except Exception as e:
             self.logger.error(f"Erro no processamento: {str(e)}")
             raise
     
+    def _tipos_origem(self) -> Dict[str, type]:
+        """Colunas do Excel declaradas no registro, com o tipo de leitura de cada uma"""
+        tipos = {}
+        for tabela in TABELAS.values():
+            for coluna in tabela.colunas:
+                if coluna.origem is not None:
+                    tipos[coluna.origem] = self.TIPOS_LEITURA.get(coluna.tipo)
+        return tipos
+    
     def _ler_arquivo(self) -> pd.DataFrame:
-        """Lê arquivo Excel com pandas"""
+        """Lê do Excel apenas as colunas declaradas no registro"""
         try:
+            tipos = self._tipos_origem()
             return pd.read_excel(
                 self.arquivo,
-                dtype={
-                    'Equipamento': int,
-                    'Modelo/Versão': str,
-                    'Usuário': str,
-                    'Classe': str,
-                    'Medidor': str
-                }
+                engine=ENGINE_EXCEL,
+                usecols=list(tipos),
+                dtype={coluna: tipo for coluna, tipo in tipos.items() if tipo is not None}
             )
         except Exception as e:
             self.logger.error(f"Erro na leitura do arquivo: {str(e)}")
             raise
     
-    def _processar_dimensoes(self, df: pd.DataFrame) -> Dict[str, List]:
-        """Processa dimensões do dataframe"""
+    def _converter_colunas(self, df: pd.DataFrame) -> Dict[str, list]:
+        """
+        Converte cada coluna uma única vez para lista de valores Python
+        Valores numéricos ausentes viram 0 e textos ausentes viram None.
+        """
+        colunas = {}
+        for nome in df.columns:
+            serie = df[nome]
+            if pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie):
+                colunas[nome] = serie.astype(object).where(serie.notna(), None).tolist()
+            else:
+                colunas[nome] = serie.fillna(0).tolist()
+        return colunas
+    
+    def _valores_gerados(self) -> Dict[str, str]:
+        """Valores das colunas de controle preenchidas pelo transformador"""
+        data_processamento = self.data_processamento.strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            'data_criacao': data_processamento,
+            'data_referencia': self.data_referencia.strftime("%Y-%m-%d"),
+            'data_processamento': data_processamento
+        }
+    
+    def _ler_staging(self, chave: str) -> Optional[Tuple[Dict[str, TabelaCarga], Dict[str, TabelaCarga]]]:
+        """Monta dimensões e fatos a partir do staging, com as colunas geradas atualizadas"""
+        with self.medidor.etapa('staging:leitura') as etapa:
+            tabelas = self.staging.ler(chave)
+            if tabelas is None:
+                return None
+            colunas = {nome: self._converter_colunas(df) for nome, df in tabelas.items()}
+            etapa['linhas'] = len(tabelas['dim_equipamento'])
+        preparado = {
+            nome: self._projetar(colunas[nome], nome, por_origem=False)
+            for nome in TABELAS
+        }
+        dimensoes = {nome: carga for nome, carga in preparado.items() if TABELAS[nome].dimensao}
+        fatos = {nome: carga for nome, carga in preparado.items() if not TABELAS[nome].dimensao}
+        return dimensoes, fatos
+    
+    def _gravar_staging(self, chave: str, tabelas: Dict[str, TabelaCarga]):
+        """Grava o staging; uma falha aqui não interrompe a carga"""
+        try:
+            with self.medidor.etapa('staging:gravacao', len(tabelas['dim_equipamento'][1])):
+                self.staging.gravar(chave, tabelas)
+        except Exception as e:
+            self.logger.warning(f"Não foi possível gravar o staging: {str(e)}")
+    
+    def _projetar(self, colunas: Dict[str, list], nome_tabela: str,
+                  por_origem: bool = True) -> TabelaCarga:
+        """
+        Monta uma tabela de carga a partir das colunas já convertidas
+        Args:
+            colunas: Listas de valores por coluna
+            nome_tabela: Tabela do registro
+            por_origem: True se as colunas têm os nomes do Excel; False se têm
+                os nomes do banco (staging)
+        """
+        with self.medidor.etapa(f"transformacao:{nome_tabela}") as etapa:
+            gerados = self._valores_gerados()
+            valores = [
+                repeat(gerados[coluna.nome]) if coluna.origem is None
+                else colunas[coluna.origem if por_origem else coluna.nome]
+                for coluna in TABELAS[nome_tabela].colunas
+                if coluna.carregada
+            ]
+            linhas = list(zip(*valores))
+            etapa['linhas'] = len(linhas)
+        return list(TABELAS[nome_tabela].colunas_carga), linhas
+    
+    def _processar_dimensoes(self, colunas: Dict[str, list]) -> Dict[str, TabelaCarga]:
+        """Processa dimensões a partir das colunas convertidas"""
         try:
             dimensoes = {
-                'dim_equipamento': df[['Equipamento', 'Modelo/Versão', 'Usuário', 'Classe']]
-                .rename(columns={
-                    'Equipamento': 'id_equipamento',
-                    'Modelo/Versão': 'modelo',
-                    'Usuário': 'usuario',
-                    'Classe': 'classe'
-                })
-                .assign(data_criacao=self.data_processamento.strftime("%Y-%m-%d %H:%M:%S"))  # Converte para string compatível com SQLite
-                .to_dict('records')
+                nome: self._projetar(colunas, nome)
+                for nome, tabela in TABELAS.items() if tabela.dimensao
             }
-            self.logger.info(f"Processadas {len(dimensoes['dim_equipamento'])} dimensões")
+            self.logger.info(f"Processadas {len(dimensoes['dim_equipamento'][1])} dimensões")
             return dimensoes
         except Exception as e:
             self.logger.error(f"Erro no processamento de dimensões: {str(e)}")
             raise
     
-    def _processar_fatos(self, df: pd.DataFrame) -> List[Dict]:
-        """Processa tabelas de fatos"""
+    def _processar_fatos(self, colunas: Dict[str, list]) -> Dict[str, TabelaCarga]:
+        """Processa todas as tabelas de fatos numa única passagem pelas colunas"""
         try:
             fatos = {
-                'fato_uso': self._processar_fato_uso(df),
-                'fato_custo': self._processar_fato_custo(df),
-                'fato_combustivel': self._processar_fato_combustivel(df),
-                'fato_manutencao': self._processar_fato_manutencao(df),
-                'fato_reforma': self._processar_fato_reforma(df)
+                nome: self._projetar(colunas, nome)
+                for nome, tabela in TABELAS.items() if not tabela.dimensao
             }
             self.logger.info("Processamento de fatos concluído")
             return fatos
         except Exception as e:
             self.logger.error(f"Erro no processamento de fatos: {str(e)}")
             raise
-
-    def _processar_fato_uso(self, df: pd.DataFrame) -> List[Dict]:
-        """Processa fatos de uso e trata valores nulos corretamente"""
-        return (df[[
-            'Equipamento',
-            'Medidor',
-            'Uso (km ou hora) Estimado',
-            'Uso (km ou hora) Realizado',
-            'Uso (km ou hora) Diferença'
-        ]].rename(columns={
-            'Equipamento': 'id_equipamento',
-            'Medidor': 'tipo_medidor',
-            'Uso (km ou hora) Estimado': 'uso_estimado',
-            'Uso (km ou hora) Realizado': 'uso_realizado',
-            'Uso (km ou hora) Diferença': 'uso_diferenca'
-        })
-        .assign(
-            data_referencia=self.data_referencia.strftime("%Y-%m-%d"),
-            data_processamento=self.data_processamento.strftime("%Y-%m-%d %H:%M:%S")
-        )
-        .replace({np.nan: 0})  # Substitui NaN por 0
-        .to_dict('records'))
-
-    def _processar_fato_custo(self, df: pd.DataFrame) -> List[Dict]:
-        """Processa fatos de custo"""
-        return (df[[
-            'Equipamento',
-            'Custo por Km ou hora Orçado',
-            'Custo por Km ou hora Realizado',
-            'Custo por Km ou hora Diferença',
-            'Total Orçado',
-            'Total Realizado',
-            'Total Diferença'
-        ]].rename(columns={
-            'Equipamento': 'id_equipamento',
-            'Custo por Km ou hora Orçado': 'custo_hora_estimado',
-            'Custo por Km ou hora Realizado': 'custo_hora_realizado',
-            'Custo por Km ou hora Diferença': 'custo_hora_diferenca',
-            'Total Orçado': 'total_estimado',
-            'Total Realizado': 'total_realizado',
-            'Total Diferença': 'total_diferenca'
-        })
-        .assign(
-            data_referencia=self.data_referencia.strftime("%Y-%m-%d"),
-            data_processamento=self.data_processamento.strftime("%Y-%m-%d %H:%M:%S")
-        )
-        .replace({np.nan: 0})  # Substitui NaN por 0
-        .to_dict('records'))
-
-    def _processar_fato_combustivel(self, df: pd.DataFrame) -> List[Dict]:
-        """Processa fatos de combustível"""
-        return (df[[
-            'Equipamento',
-            'Combustíveis (l) Orçado',
-            'Combustíveis (l) Realizado',
-            'Combustíveis (l) Diferença',
-            'VU Combustível Orçado',
-            'VU Combustível Realizado',
-            'VU Combustível Diferença',
-            'Combustíveis Orçado',
-            'Combustíveis Realizado',
-            'Combustíveis Diferença'
-        ]].rename(columns={
-            'Equipamento': 'id_equipamento',
-            'Combustíveis (l) Orçado': 'comb_litros_estimado',
-            'Combustíveis (l) Realizado': 'comb_litros_realizado',
-            'Combustíveis (l) Diferença': 'comb_litros_diferenca',
-            'VU Combustível Orçado': 'comb_valor_unitario_estimado',
-            'VU Combustível Realizado': 'comb_valor_unitario_realizado',
-            'VU Combustível Diferença': 'comb_valor_unitario_diferenca',
-            'Combustíveis Orçado': 'comb_total_estimado',
-            'Combustíveis Realizado': 'comb_total_realizado',
-            'Combustíveis Diferença': 'comb_total_diferenca'
-        })
-        .assign(
-            data_referencia=self.data_referencia.strftime("%Y-%m-%d"),
-            data_processamento=self.data_processamento.strftime("%Y-%m-%d %H:%M:%S")
-        )
-        .replace({np.nan: 0})
-        .to_dict('records'))
-
-    def _processar_fato_manutencao(self, df: pd.DataFrame) -> List[Dict]:
-        """Processa fatos de manutenção"""
-        return (df[[
-            'Equipamento',
-            'Lubrificantes Orçado',
-            'Lubrificantes Realizado',
-            'Lubrificantes Diferença',
-            'Filtros Orçado',
-            'Filtros Realizado',
-            'Filtros Diferença',
-            'Graxas Orçado',
-            'Graxas Realizado',
-            'Graxas Diferença',
-            'Peças, Serviços e Pneus Orçado',
-            'Peças, Serviços e Pneus Realizado',
-            'Peças, Serviços e Pneus Diferença'
-        ]].rename(columns={
-            'Equipamento': 'id_equipamento',
-            'Lubrificantes Orçado': 'lubrificantes_estimado',
-            'Lubrificantes Realizado': 'lubrificantes_realizado',
-            'Lubrificantes Diferença': 'lubrificantes_diferenca',
-            'Filtros Orçado': 'filtros_estimado',
-            'Filtros Realizado': 'filtros_realizado',
-            'Filtros Diferença': 'filtros_diferenca',
-            'Graxas Orçado': 'graxas_estimado',
-            'Graxas Realizado': 'graxas_realizado',
-            'Graxas Diferença': 'graxas_diferenca',
-            'Peças, Serviços e Pneus Orçado': 'pecas_servicos_estimado',
-            'Peças, Serviços e Pneus Realizado': 'pecas_servicos_realizado',
-            'Peças, Serviços e Pneus Diferença': 'pecas_servicos_diferenca'
-        })
-        .assign(
-            data_referencia=self.data_referencia.strftime("%Y-%m-%d"),
-            data_processamento=self.data_processamento.strftime("%Y-%m-%d %H:%M:%S")
-        )
-        .replace({np.nan: 0})
-        .to_dict('records'))
-
-    def _processar_fato_reforma(self, df: pd.DataFrame) -> List[Dict]:
-        """Processa fatos de reforma"""
-        return (df[[
-            'Equipamento',
-            'Reforma Orçada',
-            'Reforma Realizada',
-            'Reforma Diferença'
-        ]].rename(columns={
-            'Equipamento': 'id_equipamento',
-            'Reforma Orçada': 'reforma_estimado',
-            'Reforma Realizada': 'reforma_realizado',
-            'Reforma Diferença': 'reforma_diferenca'
-        })
-        .assign(
-            data_referencia=self.data_referencia.strftime("%Y-%m-%d"),
-            data_processamento=self.data_processamento.strftime("%Y-%m-%d %H:%M:%S")
-        )
-        .replace({np.nan: 0})
-        .to_dict('records'))
@@ -0,0 +1,92 @@
+# transformador/staging.py
+"""
+Módulo: Staging em Parquet
+Objetivo: Guardar as tabelas normalizadas de cada planilha em Parquet,
+indexadas pelo hash do conteúdo do arquivo, para que recargas, migrações e
+reprocessamentos não precisem ler o Excel de novo.
+
+Cada versão de planilha ocupa um diretório <staging>/<chave>/ com um arquivo
+<tabela>.parquet por tabela do registro. As colunas geradas (datas de
+controle e de referência) não são guardadas: são preenchidas de novo a cada
+uso, então a mesma planilha pode ser reaproveitada para outro mês.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+import shutil
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from mapeamento import TABELAS
+
+# Parquet depende do pyarrow; sem ele o staging fica desligado
+PARQUET_DISPONIVEL = importlib.util.find_spec('pyarrow') is not None
+
+class StagingParquet:
+    """Área de staging de tabelas normalizadas, por hash da planilha"""
+
+    TAMANHO_BLOCO_HASH = 1024 * 1024
+
+    def __init__(self, diretorio: Path, logger: logging.Logger):
+        self.diretorio = Path(diretorio)
+        self.logger = logger
+
+    @staticmethod
+    def assinatura_registro() -> str:
+        """Resumo das colunas do registro; muda a chave quando o mapeamento muda"""
+        return ';'.join(
+            f"{tabela.nome}:" + ','.join(f"{c.nome}={c.origem}" for c in tabela.colunas if c.origem)
+            for tabela in TABELAS.values()
+        )
+
+    def chave(self, arquivo: Path) -> str:
+        """Hash do conteúdo da planilha combinado com a assinatura do registro"""
+        resumo = hashlib.blake2b(self.assinatura_registro().encode('utf-8'), digest_size=16)
+        with open(arquivo, 'rb') as f:
+            for bloco in iter(lambda: f.read(self.TAMANHO_BLOCO_HASH), b''):
+                resumo.update(bloco)
+        return resumo.hexdigest()
+
+    def ler(self, chave: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Lê as tabelas de uma versão já preparada
+        Returns:
+            Dict: DataFrame por tabela, ou None se a chave não estiver no staging
+        """
+        diretorio = self.diretorio / chave
+        if not diretorio.is_dir():
+            return None
+        try:
+            tabelas = {nome: pd.read_parquet(diretorio / f"{nome}.parquet") for nome in TABELAS}
+            self.logger.info(f"Staging reaproveitado: {diretorio}")
+            return tabelas
+        except Exception as e:
+            self.logger.warning(f"Staging {diretorio} ilegível, planilha será lida novamente: {str(e)}")
+            return None
+
+    def gravar(self, chave: str, tabelas: Dict[str, Tuple[List[str], List[tuple]]]):
+        """
+        Grava as tabelas de carga sem as colunas geradas
+        A gravação é feita num diretório temporário renomeado ao final, para que
+        uma execução interrompida nunca deixe uma versão incompleta.
+        """
+        destino = self.diretorio / chave
+        if destino.is_dir():
+            return
+        temporario = self.diretorio / f".{chave}.{os.getpid()}.tmp"
+        temporario.mkdir(parents=True, exist_ok=True)
+        try:
+            for nome, (colunas, linhas) in tabelas.items():
+                gravadas = [c.nome for c in TABELAS[nome].colunas if c.origem is not None]
+                df = pd.DataFrame.from_records(linhas, columns=colunas)
+                df[gravadas].to_parquet(temporario / f"{nome}.parquet", index=False)
+            temporario.rename(destino)
+            self.logger.info(f"Staging gravado em {destino}")
+        except OSError:
+            # Outro processo gravou a mesma versão antes (modo lote)
+            if not destino.is_dir():
+                raise
+        finally:
+            shutil.rmtree(temporario, ignore_errors=True)
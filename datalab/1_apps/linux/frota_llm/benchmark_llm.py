@@ -0,0 +1,153 @@
+"""
+Benchmark do caminho da LLM no dashboard.
+
+Reproduz um corpus de perguntas do dashboard para cada estratégia de montagem
+do contexto e mede, por pergunta:
+  - tamanho do prompt (caracteres e tokens estimados);
+  - tempo de montagem do contexto;
+  - tempo até o primeiro texto visível (sem o bloco <think>);
+  - latência total da resposta.
+
+Por padrão usa o MockBackend (sem chamar a API), cuja latência cresce com o
+tamanho do prompt; com --backend groq mede a API real.
+
+Uso:
+    python benchmark_llm.py
+    python benchmark_llm.py --perguntas perguntas.txt --usuario "FAZENDA CANADA" --saida resultado.json
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import date
+from typing import Callable, Dict, List
+import pandas as pd
+from db_access import get_additional_data, get_filtered_data
+from db_filters import apply_flags, calcular_multiplicadores
+from llm_backends import MockBackend
+from llm_context import CHARS_PER_TOKEN, build_context
+from llm_session import build_messages, get_backend, set_backend, stream_groq
+
+# Perguntas típicas feitas no dashboard
+DEFAULT_QUESTIONS = [
+    "Quais equipamentos tiveram o maior desvio entre o orçado e o realizado?",
+    "Qual classe de equipamento está mais acima do orçamento?",
+    "Compare o custo por hora orçado e realizado dos caminhões.",
+    "Quais fazendas estão gastando mais com manutenção do que o previsto?",
+    "Existe superutilização de algum trator? Mostre a taxa de utilização.",
+    "Resuma o consumo de combustível em litros e em reais por classe.",
+    "Quais equipamentos não tinham orçamento mas tiveram custo realizado?",
+    "Qual o impacto das reformas no total realizado do período?",
+]
+
+def _legacy_json(df: pd.DataFrame, additional_data: Dict, filtros: Dict) -> str:
+    """Contexto antigo: todos os registros como JSON (referência de comparação)."""
+    additional_records = {
+        table: pd.DataFrame(columns).to_dict(orient="records")
+        for table, columns in additional_data.items()
+    }
+    return str({"filtered_data": df.to_dict(orient="records"), "additional_data": additional_records})
+
+# Estratégias de montagem do contexto comparadas
+STRATEGIES: Dict[str, Callable[[pd.DataFrame, Dict, Dict], str]] = {
+    "json_completo": _legacy_json,
+    "resumo_6000": lambda df, ad, f: build_context(df, ad, f, token_budget=6000),
+    "resumo_2000": lambda df, ad, f: build_context(df, ad, f, token_budget=2000),
+}
+
+def load_data(filtros: Dict):
+    """Carrega os dados como o dashboard: registros com flags e tabelas adicionais."""
+    df = get_filtered_data(filtros)
+    if not df.empty:
+        if "Consumo Multiplicador" not in df.columns:
+            df = calcular_multiplicadores(df)
+        df = apply_flags(df)
+    return df, get_additional_data(filtros)
+
+def measure(context: str, question: str, model: str) -> Dict:
+    """Mede uma pergunta: tamanho do prompt, primeiro texto visível e total."""
+    prompt_chars = sum(len(m["content"]) for m in build_messages(context, question))
+    start = time.perf_counter()
+    first_token = None
+    answer = []
+    for piece in stream_groq(context, question, model_name=model, use_cache=False):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        answer.append(piece)
+    return {
+        "prompt_chars": prompt_chars,
+        "prompt_tokens": prompt_chars // CHARS_PER_TOKEN,
+        "ttft_s": round(first_token or 0.0, 4),
+        "total_s": round(time.perf_counter() - start, 4),
+        "answer_chars": len("".join(answer)),
+    }
+
+def run(questions: List[str], filtros: Dict, model: str) -> List[Dict]:
+    """Executa todas as perguntas para cada estratégia."""
+    df, additional_data = load_data(filtros)
+    results = []
+    for strategy, builder in STRATEGIES.items():
+        start = time.perf_counter()
+        context = builder(df, additional_data, filtros)
+        build_s = time.perf_counter() - start
+        for question in questions:
+            result = measure(context, question, model)
+            result.update({"strategy": strategy, "question": question, "context_build_s": round(build_s, 4)})
+            results.append(result)
+    return results
+
+def summarize(results: List[Dict]):
+    """Tabela com medianas e máximos por estratégia."""
+    print(f"{'estratégia':<16}{'tokens':>10}{'montagem s':>12}{'ttft p50':>10}{'ttft máx':>10}{'total p50':>11}{'total máx':>11}")
+    for strategy in STRATEGIES:
+        rows = [r for r in results if r["strategy"] == strategy]
+        if not rows:
+            continue
+        ttft = [r["ttft_s"] for r in rows]
+        total = [r["total_s"] for r in rows]
+        print(
+            f"{strategy:<16}{rows[0]['prompt_tokens']:>10}{rows[0]['context_build_s']:>12.3f}"
+            f"{statistics.median(ttft):>10.3f}{max(ttft):>10.3f}"
+            f"{statistics.median(total):>11.3f}{max(total):>11.3f}"
+        )
+
+def parse_args() -> argparse.Namespace:
+    """Lê os argumentos de linha de comando."""
+    parser = argparse.ArgumentParser(description="Benchmark de contexto e latência da LLM do dashboard de frota")
+    parser.add_argument("--perguntas", help="Arquivo com uma pergunta por linha (padrão: corpus embutido)")
+    parser.add_argument("--backend", choices=("mock", "groq"), default="mock")
+    parser.add_argument("--modelo", default="deepseek-r1-distill-llama-70b")
+    parser.add_argument("--usuario", nargs="*", help="Filtro de usuário")
+    parser.add_argument("--classe", nargs="*", help="Filtro de classe")
+    parser.add_argument("--inicio", type=date.fromisoformat, help="Data de referência inicial (AAAA-MM-DD)")
+    parser.add_argument("--fim", type=date.fromisoformat, help="Data de referência final (AAAA-MM-DD)")
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latência base do mock até o primeiro pedaço (s)")
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados por pergunta")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.backend == "mock":
+        set_backend(MockBackend(first_token_latency=args.latencia))
+    questions = DEFAULT_QUESTIONS
+    if args.perguntas:
+        with open(args.perguntas, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    filtros = {
+        "data_referencia": [args.inicio, args.fim] if args.inicio and args.fim else None,
+        "id_equipamento": None,
+        "usuario": args.usuario,
+        "classe": args.classe,
+    }
+
+    print(f"Backend: {get_backend().name}; {len(questions)} pergunta(s); {len(STRATEGIES)} estratégia(s)")
+    results = run(questions, filtros, args.modelo)
+    summarize(results)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Resultados gravados em {args.saida}")
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,8 @@ from db_access import (
     get_additional_data,
     get_unique_values
 )
-from llm_session import query_groq
+from llm_session import stream_groq
+from llm_context import build_context
 from db_filters import apply_flags, calcular_multiplicadores
 
 # CSS para personalização (igual ao do programa original)
@@ -122,6 +123,12 @@ if df.empty:
 
 # Se houver dados, exibe métricas e gráfico
 if not df.empty:
+    # Multiplicadores e sinalizadores calculados uma vez para gráfico e tabela
+    # (os multiplicadores já vêm do agregado mensal; calcula apenas em bancos antigos)
+    if 'Consumo Multiplicador' not in df.columns:
+        df = calcular_multiplicadores(df)
+    df = apply_flags(df)
+
     col1, col2 = st.columns(2)
     with col1:
         st.markdown(f'<div class="custom-card"><h3>Total de Registros</h3><p>{len(df):,}</p></div>', unsafe_allow_html=True)
@@ -130,19 +137,10 @@ if not df.empty:
         st.markdown(f'<div class="custom-card"><h3>Total Estimado</h3><p>R$ {total_estimado:,.0f}</p></div>', unsafe_allow_html=True)
     
     # Preparação dos dados para o gráfico
-    chart_data = df.copy()
-    chart_data['Taxa Utilização Multiplicador'] = chart_data.apply(
-        lambda row: row['custo_hora_realizado'] / row['custo_hora_estimado'] if row['custo_hora_estimado'] != 0 else 0,
-        axis=1
-    )
-    chart_data['Consumo Multiplicador'] = chart_data.apply(
-        lambda row: row['total_realizado'] / row['total_estimado'] if row['total_estimado'] != 0 else 0,
-        axis=1
-    )
     plot_data = pd.DataFrame({
-        'Equipamento': chart_data['id_equipamento'].astype(str),
-        'Custo vs Planejado': chart_data['Taxa Utilização Multiplicador'],
-        'Consumo vs Planejado': chart_data['Consumo Multiplicador']
+        'Equipamento': df['id_equipamento'].astype(str),
+        'Custo vs Planejado': df['Taxa Utilização Multiplicador'],
+        'Consumo vs Planejado': df['Consumo Multiplicador']
     })
 
     # Criação do gráfico com as atualizações
@@ -200,12 +198,8 @@ if not df.empty:
     # Exibição da tabela exatamente igual ao programa original
     st.subheader("Dados filtrados")
     if not df.empty:
-        # Aplica os sinalizadores (com a lógica ajustada) e calcula multiplicadores
-        df = apply_flags(df)
-        df = calcular_multiplicadores(df)
-        
-        # Renomeia colunas para exibição
-        df = df.rename(columns={
+        # Renomeia colunas para exibição (df segue intacto para o contexto da LLM)
+        table_df = df.rename(columns={
             'usuario': 'Usuário',
             'classe': 'Classe',
             'id_equipamento': 'Equip',
@@ -218,14 +212,14 @@ if not df.empty:
         })
 
         # Ajusta a ordem das colunas para exibição
-        df = df[['Usuário', 'Classe', 'Equip', 'Custo Orçado', 'Custo Realizado', 'Custo Dif', 
+        table_df = table_df[['Usuário', 'Classe', 'Equip', 'Custo Orçado', 'Custo Realizado', 'Custo Dif', 
                 'Total Orçado', 'Total Realizado', 'Total Dif', 'Sinalizador']]
 
         # Arredonda os valores numéricos para facilitar a visualização
-        df.update(df.select_dtypes(include=['float', 'int']).round(0))
+        table_df.update(table_df.select_dtypes(include=['float', 'int']).round(0))
         
         # Formata a tabela com estilos personalizados
-        styled_df = df.style.format({
+        styled_df = table_df.style.format({
             'Custo Orçado': 'R$ {:,.0f}',
             'Custo Realizado': 'R$ {:,.0f}',
             'Custo Dif': 'R$ {:,.0f}',
@@ -249,9 +243,9 @@ st.subheader("Perguntas sobre os dados")
 user_question = st.text_area("descreva em tom natural, o mais completo possível:", height=100, key="auto_expanding_textarea", max_chars=None)
 if st.button("enviar"):
     if user_question:
-        # Combina os dados filtrados e adicionais para enviar à LLM
-        combined_data = {"filtered_data": df.to_dict(orient='records'), "additional_data": additional_data}
-        answer = query_groq(combined_data, user_question)
-        st.markdown(answer)
+        # Resume os dados filtrados e adicionais dentro do orçamento de tokens
+        context = build_context(df, additional_data, filtros)
+        # Exibe a resposta à medida que chega, sem o raciocínio interno
+        st.write_stream(stream_groq(context, user_question))
     else:
         st.warning("Por favor, insira uma pergunta.")
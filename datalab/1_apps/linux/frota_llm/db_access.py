@@ -1,86 +1,180 @@
+import json
 import sqlite3
-import os
 import pandas as pd
 import streamlit as st
+from db_pool import get_pool
+from query_builder import build_equipment_filters, build_filters, filter_params, has_equipment_filters
+from result_cache import cached_query
 
-def get_db_connection(db_filename: str = "frota.db") -> sqlite3.Connection:
-    """
-    Estabelece a conexão com o banco de dados SQLite.
-    """
-    try:
-        db_path = os.path.join(os.path.dirname(__file__), db_filename)
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
-        st.error(f"Erro ao conectar ao banco de dados: {e}")
-        return None
+# Colunas da dimensão que podem alimentar os filtros do dashboard
+UNIQUE_VALUE_COLUMNS = ("usuario", "classe", "modelo")
+
+# Tabelas de fatos enviadas como contexto adicional à LLM
+ADDITIONAL_TABLES = ("fato_combustivel", "fato_manutencao", "fato_reforma", "fato_uso")
+# Colunas técnicas do ETL, sem interesse para a análise
+ADDITIONAL_EXCLUDED_COLUMNS = {"id", "hash_linha"}
+
+# Tabelas de fatos cujos limites de data inicializam os filtros
+FACT_TABLES = ("fato_custo",) + ADDITIONAL_TABLES
+
+# Limites mantidos pelo ETL em meta_fatos, uma linha por tabela de fatos
+DATE_BOUNDS_META_QUERY = """
+    SELECT
+        MIN(min_data_referencia) AS min_data_referencia,
+        MAX(max_data_referencia) AS max_data_referencia,
+        MIN(min_data_processamento) AS min_data_processamento,
+        MAX(max_data_processamento) AS max_data_processamento,
+        COUNT(*) AS tabelas
+    FROM meta_fatos
+"""
+
+# Bancos sem meta_fatos: um MIN/MAX por tabela e coluna, em subconsultas
+# separadas. As de data_referencia são respondidas pelo índice da coluna; as de
+# data_processamento não têm índice e varrem cada tabela de fatos.
+DATE_BOUNDS_FALLBACK_QUERY = """
+    SELECT
+        MIN(min_data_referencia) AS min_data_referencia,
+        MAX(max_data_referencia) AS max_data_referencia,
+        MIN(min_data_processamento) AS min_data_processamento,
+        MAX(max_data_processamento) AS max_data_processamento
+    FROM ({bounds})
+""".format(bounds=" UNION ALL ".join(
+    "SELECT "
+    f"(SELECT MIN(data_referencia) FROM {table}) AS min_data_referencia, "
+    f"(SELECT MAX(data_referencia) FROM {table}) AS max_data_referencia, "
+    f"(SELECT MIN(data_processamento) FROM {table}) AS min_data_processamento, "
+    f"(SELECT MAX(data_processamento) FROM {table}) AS max_data_processamento"
+    for table in FACT_TABLES
+))
+
+# Primeiro e último mês do período no agregado e em fato_custo; cada
+# subconsulta é respondida pelo índice que começa em data_referencia
+AGGREGATE_BOUNDS_QUERY = """
+    SELECT
+        (SELECT MIN(data_referencia) FROM agg_custo_equipamento_mensal
+         WHERE data_referencia BETWEEN :data_inicio AND :data_fim) AS agg_min,
+        (SELECT MAX(data_referencia) FROM agg_custo_equipamento_mensal
+         WHERE data_referencia BETWEEN :data_inicio AND :data_fim) AS agg_max,
+        (SELECT MIN(data_referencia) FROM fato_custo
+         WHERE data_referencia BETWEEN :data_inicio AND :data_fim) AS fato_min,
+        (SELECT MAX(data_referencia) FROM fato_custo
+         WHERE data_referencia BETWEEN :data_inicio AND :data_fim) AS fato_max
+"""
+
+EQUIPMENT_IDS_QUERY = "SELECT de.id_equipamento FROM dim_equipamento AS de WHERE {filters}"
+
+# Mesmo texto para qualquer filtro: período e conjunto de equipamentos já resolvido.
+# O JOIN mantém fora os fatos de equipamentos ausentes da dimensão.
+ADDITIONAL_FACT_QUERY = """
+    SELECT t.*
+    FROM {table} AS t
+    INNER JOIN dim_equipamento AS de
+        ON t.id_equipamento = de.id_equipamento
+    WHERE t.data_referencia BETWEEN :data_inicio AND :data_fim
+      AND (:equipamentos IS NULL OR t.id_equipamento IN (SELECT value FROM json_each(:equipamentos)))
+    ORDER BY t.data_referencia, t.id_equipamento
+"""
+
+# As funções públicas tratam os erros para o dashboard; as consultas em si
+# ficam nas funções _load_*, cacheadas por filtro e geração do banco.
 
 def get_date_defaults() -> tuple:
     """
-    Obtém as datas mínimas e máximas para inicialização dos filtros,
-    consultando várias tabelas de fatos.
-    """
-    conn = get_db_connection()
-    if not conn:
-        return None, None
-    query = """
-        SELECT 
-            MIN(data_referencia) AS min_data_referencia, 
-            MAX(data_referencia) AS max_data_referencia,
-            MIN(data_processamento) AS min_data_processamento, 
-            MAX(data_processamento) AS max_data_processamento
-        FROM (
-            SELECT data_referencia, data_processamento FROM fato_custo
-            UNION ALL
-            SELECT data_referencia, data_processamento FROM fato_combustivel
-            UNION ALL
-            SELECT data_referencia, data_processamento FROM fato_manutencao
-            UNION ALL
-            SELECT data_referencia, data_processamento FROM fato_reforma
-            UNION ALL
-            SELECT data_referencia, data_processamento FROM fato_uso
-        )
+    Obtém as datas mínimas e máximas para inicialização dos filtros, a partir
+    dos metadados gravados pelo ETL (meta_fatos) ou, em bancos sem eles, de
+    um MIN/MAX por tabela de fatos.
     """
     try:
-        result = conn.execute(query).fetchone()
-        conn.close()
-        if result:
-            min_date = min(result["min_data_referencia"], result["min_data_processamento"])
-            max_date = max(result["max_data_referencia"], result["max_data_processamento"])
-            return min_date, max_date
-        else:
-            return None, None
+        return _load_date_defaults()
     except Exception as e:
         st.error(f"Erro ao obter datas padrão: {e}")
         return None, None
 
-def build_filters(filtros: dict, alias: str = 'fc') -> str:
-    """
-    Constrói dinamicamente a cláusula WHERE da query SQL com base nos filtros.
-    """
-    conditions = []
-    if filtros.get("data_referencia") and len(filtros["data_referencia"]) == 2:
-        start_date, end_date = filtros["data_referencia"]
-        conditions.append(f"{alias}.data_referencia BETWEEN '{start_date}' AND '{end_date}'")
-    if filtros.get("id_equipamento"):
-        ids = ",".join(map(str, filtros["id_equipamento"]))
-        conditions.append(f"{alias}.id_equipamento IN ({ids})")
-    if filtros.get("usuario") and "Todos" not in filtros["usuario"]:
-        usuarios = "', '".join(filtros["usuario"])
-        conditions.append(f"de.usuario IN ('{usuarios}')")
-    if filtros.get("classe") and "Todos" not in filtros["classe"]:
-        classes = "', '".join(filtros["classe"])
-        conditions.append(f"de.classe IN ('{classes}')")
-    return " AND ".join(conditions)
+@cached_query
+def _load_date_defaults() -> tuple:
+    with get_pool().connection() as conn:
+        result = None
+        if has_table(conn, "meta_fatos"):
+            result = conn.execute(DATE_BOUNDS_META_QUERY).fetchone()
+            # Metadados incompletos (ex.: tabela de fatos nova) usam o cálculo direto
+            if result["tabelas"] < len(FACT_TABLES):
+                result = None
+        if result is None:
+            result = conn.execute(DATE_BOUNDS_FALLBACK_QUERY).fetchone()
+    if result:
+        min_date = min(result["min_data_referencia"], result["min_data_processamento"])
+        max_date = max(result["max_data_referencia"], result["max_data_processamento"])
+        return min_date, max_date
+    return None, None
+
+def has_table(conn: sqlite3.Connection, table_name: str) -> bool:
+    """
+    Indica se a tabela existe no banco (as tabelas agregadas só existem
+    após a primeira carga feita pela versão atual do ETL).
+    """
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    return conn.execute(query, (table_name,)).fetchone() is not None
 
 def get_filtered_data(filtros: dict) -> pd.DataFrame:
     """
     Carrega os dados filtrados a partir do banco de dados.
+    Lê o agregado mensal por equipamento mantido pelo ETL, que já traz
+    classe, usuário e multiplicadores; sem ele, consulta fato_custo.
     """
-    conn = get_db_connection()
-    if not conn:
+    try:
+        return _load_filtered_data(filtros)
+    except Exception as e:
+        st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
+
+@cached_query
+def _load_filtered_data(filtros: dict) -> pd.DataFrame:
+    with get_pool().connection() as conn:
+        query, params = get_custo_query(conn, filtros)
+        return pd.read_sql_query(query, conn, params=params)
+
+def aggregate_is_current(conn: sqlite3.Connection, params: dict) -> bool:
+    """
+    Indica se o agregado mensal cobre o período pedido: existe e tem os
+    mesmos primeiro e último meses que fato_custo no intervalo. Um agregado
+    vazio ou desatualizado (ex.: carga interrompida) não é usado.
+    """
+    if not has_table(conn, "agg_custo_equipamento_mensal"):
+        return False
+    row = conn.execute(AGGREGATE_BOUNDS_QUERY, params).fetchone()
+    return (row["agg_min"], row["agg_max"]) == (row["fato_min"], row["fato_max"])
+
+def get_custo_query(conn: sqlite3.Connection, filtros: dict) -> tuple:
+    """
+    Query de custos: agregado mensal quando está em dia com fato_custo no
+    período, senão fato_custo.
+    """
+    if aggregate_is_current(conn, filter_params(filtros)):
+        query = """
+            SELECT ag.id_equipamento, 
+                   ag.custo_hora_estimado, 
+                   ag.custo_hora_realizado, 
+                   -ag.custo_hora_diferenca AS custo_hora_diferenca, 
+                   ag.total_estimado, 
+                   ag.total_realizado, 
+                   -ag.total_diferenca AS total_diferenca, 
+                   ag.classe, 
+                   ag.usuario,
+                   ag.taxa_utilizacao_multiplicador AS "Taxa Utilização Multiplicador",
+                   ag.consumo_multiplicador AS "Consumo Multiplicador"
+            FROM agg_custo_equipamento_mensal AS ag
+        """
+        filters_str, params = build_filters(filtros, alias='ag', dim_alias='ag')
+        query += f" WHERE {filters_str}"
+        query += " ORDER BY ag.data_referencia, ag.classe, ag.id_equipamento"
+        return query, params
+    return get_fato_custo_query(filtros)
+
+def get_fato_custo_query(filtros: dict) -> tuple:
+    """
+    Query original sobre fato_custo, usada quando o agregado não existe ou
+    não está em dia.
+    """
     query = """
         SELECT fc.id_equipamento, 
                fc.custo_hora_estimado, 
@@ -95,58 +189,70 @@ def get_filtered_data(filtros: dict) -> pd.DataFrame:
         INNER JOIN dim_equipamento AS de
             ON fc.id_equipamento = de.id_equipamento
     """
-    filters_str = build_filters(filtros)
-    if filters_str:
-        query += f" WHERE {filters_str}"
+    filters_str, params = build_filters(filtros)
+    query += f" WHERE {filters_str}"
     query += " ORDER BY fc.data_referencia, de.classe, fc.id_equipamento"
-    try:
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
-    except Exception as e:
-        st.error(f"Erro ao carregar dados: {e}")
-        return pd.DataFrame()
+    return query, params
 
 def get_additional_data(filtros: dict) -> dict:
     """
     Extrai dados adicionais de outras tabelas para enriquecer o dataset.
+    Retorna, por tabela, um dicionário coluna -> lista de valores, mais
+    compacto que uma lista de registros ao ser enviado à LLM.
     """
-    conn = get_db_connection()
-    if not conn:
+    try:
+        return _load_additional_data(filtros)
+    except Exception as e:
+        st.error(f"Erro ao carregar dados adicionais: {e}")
         return {}
-    additional_data = {}
-    tables_to_include = ["fato_combustivel", "fato_manutencao", "fato_reforma", "fato_uso"]
-    for table in tables_to_include:
-        query = f"""
-            SELECT t.*
-            FROM {table} AS t
-            INNER JOIN dim_equipamento AS de
-                ON t.id_equipamento = de.id_equipamento
-            WHERE t.id_equipamento IN (SELECT id_equipamento FROM dim_equipamento)
-        """
-        filters_str = build_filters(filtros, alias='t')
-        if filters_str:
-            query += f" AND {filters_str}"
-        try:
-            additional_data[table] = pd.read_sql_query(query, conn).to_dict(orient='records')
-        except Exception as e:
-            st.error(f"Erro ao carregar dados da tabela {table}: {e}")
-    conn.close()
-    return additional_data
+
+@cached_query
+def _load_additional_data(filtros: dict) -> dict:
+    # O conjunto de equipamentos é resolvido uma vez na dimensão e reutilizado
+    # nas quatro tabelas, todas lidas na mesma conexão
+    filters_str, params = build_equipment_filters(filtros)
+    params["equipamentos"] = None
+    with get_pool().connection() as conn:
+        if has_equipment_filters(params):
+            query = EQUIPMENT_IDS_QUERY.format(filters=filters_str)
+            params["equipamentos"] = json.dumps([row[0] for row in conn.execute(query, params)])
+        return {
+            table: fetch_columns(conn, ADDITIONAL_FACT_QUERY.format(table=table), params)
+            for table in ADDITIONAL_TABLES
+        }
+
+def fetch_columns(conn: sqlite3.Connection, query: str, params: dict) -> dict:
+    """
+    Executa a query e devolve as colunas como listas (formato colunar),
+    sem as colunas técnicas do ETL.
+    """
+    cursor = conn.execute(query, params)
+    names = [description[0] for description in cursor.description]
+    values = list(zip(*cursor.fetchall())) or [()] * len(names)
+    return {
+        name: list(column)
+        for name, column in zip(names, values)
+        if name not in ADDITIONAL_EXCLUDED_COLUMNS
+    }
 
 def get_unique_values(column_name: str) -> list:
     """
     Retorna os valores únicos de uma coluna da tabela de dimensão,
     auxiliando na criação dos filtros.
+    O nome da coluna não pode ser parametrizado, por isso é validado.
     """
-    conn = get_db_connection()
-    if not conn:
+    if column_name not in UNIQUE_VALUE_COLUMNS:
+        st.error(f"Coluna inválida para filtro: {column_name}")
         return []
-    query = f"SELECT DISTINCT {column_name} FROM dim_equipamento"
     try:
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return sorted(df[column_name].dropna().tolist())
+        return _load_unique_values(column_name)
     except Exception as e:
         st.error(f"Erro ao carregar valores únicos para {column_name}: {e}")
         return []
+
+@cached_query
+def _load_unique_values(column_name: str) -> list:
+    query = f"SELECT DISTINCT {column_name} FROM dim_equipamento"
+    with get_pool().connection() as conn:
+        df = pd.read_sql_query(query, conn)
+    return sorted(df[column_name].dropna().tolist())
@@ -8,13 +8,18 @@ Importante:
 - Nenhum nome de variável ou assinatura de função foi alterado, garantindo a compatibilidade com o restante do sistema.
 - A configuração dos sinalizadores está centralizada no arquivo db_config.yaml, que agora é carregado utilizando
   um caminho absoluto baseado no local deste arquivo, para funcionar corretamente no Streamlit Cloud.
+- A configuração é lida no primeiro uso (get_config), não na importação; reload_config() relê o arquivo.
+  O nome CONFIG continua disponível para quem o importava.
 """
 
 import os
+import threading
 import yaml
 from typing import Dict
+import numpy as np
 import pandas as pd
 import sqlite3
+from query_builder import build_filters  # Mantido aqui por compatibilidade
 
 # Define o caminho absoluto para o arquivo db_config.yaml (localizado no mesmo diretório deste módulo)
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db_config.yaml")
@@ -52,30 +57,45 @@ def load_config():
             )
     return config
 
-# Carrega as configurações de sinalizadores utilizando o caminho absoluto para o arquivo YAML.
-CONFIG = load_config()
+# Configuração carregada no primeiro uso
+_config = None
+_config_lock = threading.Lock()
 
-def build_filters(filtros: Dict, alias: str = 'fc') -> str:
+def get_config() -> Dict:
     """
-    Constrói uma string de condições SQL a partir dos filtros fornecidos.
-    
-    Mantém a compatibilidade com as demais partes do sistema.
+    Retorna a configuração dos sinalizadores, lendo o YAML apenas na primeira
+    chamada.
+    """
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = load_config()
+    return _config
+
+def reload_config() -> Dict:
+    """
+    Relê o db_config.yaml (ex.: após editar os limites dos sinalizadores).
     """
-    conditions = []
-    data_referencia = filtros.get("data_referencia")
-    if data_referencia and len(data_referencia) == 2:
-        start_date, end_date = data_referencia
-        conditions.append(f"{alias}.data_referencia BETWEEN '{start_date}' AND '{end_date}'")
-    if filtros.get("id_equipamento"):
-        ids = ",".join(map(str, filtros["id_equipamento"]))
-        conditions.append(f"{alias}.id_equipamento IN ({ids})")
-    if filtros.get("usuario") and "Todos" not in filtros["usuario"]:
-        usuarios = "', '".join(filtros["usuario"])
-        conditions.append(f"de.usuario IN ('{usuarios}')")
-    if filtros.get("classe") and "Todos" not in filtros["classe"]:
-        classes = "', '".join(filtros["classe"])
-        conditions.append(f"de.classe IN ('{classes}')")
-    return " AND ".join(conditions)
+    global _config
+    with _config_lock:
+        _config = load_config()
+    return _config
+
+def __getattr__(name):
+    # Compatibilidade: `from db_filters import CONFIG` carrega a configuração sob demanda
+    if name == "CONFIG":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _razao(numerador: pd.Series, denominador: pd.Series) -> np.ndarray:
+    """
+    Divide duas colunas elemento a elemento, retornando 0.0 onde o
+    denominador é zero.
+    """
+    numerador = numerador.to_numpy(dtype=float)
+    denominador = denominador.to_numpy(dtype=float)
+    return np.divide(numerador, denominador, out=np.zeros_like(numerador), where=denominador != 0)
 
 def calcular_multiplicadores(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -83,20 +103,13 @@ def calcular_multiplicadores(df: pd.DataFrame) -> pd.DataFrame:
       - Taxa Utilização Multiplicador: custo_hora_realizado / custo_hora_estimado
       - Consumo Multiplicador: total_realizado / total_estimado
 
-    A divisão por zero é evitada (retorna 0.0 nesses casos).
+    A divisão por zero é evitada (retorna 0.0 nesses casos). O cálculo é
+    vetorizado, sem laço em Python por linha.
     """
     if df.empty:
         return df
-    df['Taxa Utilização Multiplicador'] = df.apply(
-        lambda row: row['custo_hora_realizado'] / row['custo_hora_estimado']
-        if row['custo_hora_estimado'] != 0 else 0.0,
-        axis=1
-    )
-    df['Consumo Multiplicador'] = df.apply(
-        lambda row: row['total_realizado'] / row['total_estimado']
-        if row['total_estimado'] != 0 else 0.0,
-        axis=1
-    )
+    df['Taxa Utilização Multiplicador'] = _razao(df['custo_hora_realizado'], df['custo_hora_estimado'])
+    df['Consumo Multiplicador'] = _razao(df['total_realizado'], df['total_estimado'])
     return df
 
 def apply_flags(df):
@@ -112,22 +125,31 @@ def apply_flags(df):
       - Se percentual > CONFIG["threshold_percentage"], retorna CONFIG["flag_over_threshold"].
       - Para desvios entre -CONFIG["threshold_percentage"] e CONFIG["threshold_percentage"], retorna CONFIG["flag_neutral"].
 
+    Os critérios são avaliados de uma vez sobre as colunas com np.select, na
+    ordem acima.
+
     OBSERVAÇÃO:
       A configuração dos sinalizadores está centralizada no arquivo db_config.yaml.
     """
-    def flag_diferenca(row):
-        # Caso especial: orçamento zero mas custo realizado > 0.
-        if row['total_estimado'] == 0 and row['total_realizado'] > 0:
-            return CONFIG["flag_no_budget"]
-
-        if row['total_estimado'] != 0:
-            percentual = (row['total_diferenca'] / row['total_estimado']) * 100
-            if percentual < -CONFIG["threshold_percentage"]:
-                return CONFIG["flag_under_threshold"]
-            elif percentual > CONFIG["threshold_percentage"]:
-                return CONFIG["flag_over_threshold"]
-
-        return CONFIG["flag_neutral"]
-
-    df['Sinalizador'] = df.apply(flag_diferenca, axis=1)
+    config = get_config()
+    estimado = df['total_estimado'].to_numpy(dtype=float)
+    realizado = df['total_realizado'].to_numpy(dtype=float)
+    percentual = _razao(df['total_diferenca'], df['total_estimado']) * 100
+    com_orcamento = estimado != 0
+    limite = config["threshold_percentage"]
+
+    df['Sinalizador'] = np.select(
+        [
+            # Caso especial: orçamento zero mas custo realizado > 0.
+            (estimado == 0) & (realizado > 0),
+            com_orcamento & (percentual < -limite),
+            com_orcamento & (percentual > limite),
+        ],
+        [
+            config["flag_no_budget"],
+            config["flag_under_threshold"],
+            config["flag_over_threshold"],
+        ],
+        default=config["flag_neutral"]
+    )
     return df
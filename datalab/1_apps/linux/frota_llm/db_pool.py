@@ -0,0 +1,127 @@
+"""
+Pool de conexões somente leitura para o banco frota.db.
+
+Cada rerun do Streamlit chamava sqlite3.connect várias vezes (uma por função
+de db_access), pagando a abertura do arquivo e a leitura do esquema a cada
+interação. O pool mantém conexões abertas, compartilhadas entre reruns e
+sessões, e cada conexão guarda seu cache de comandos preparados.
+
+Uso:
+    with get_pool().connection() as conn:
+        conn.execute("SELECT ...", params)
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+import pandas as pd
+import streamlit as st
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frota.db")
+
+# Conexões mantidas abertas; acima disso as requisições aguardam uma livre
+POOL_SIZE = 4
+# Tempo máximo de espera por uma conexão livre (segundos)
+POOL_TIMEOUT = 30
+# Comandos preparados mantidos por conexão (padrão do sqlite3 é 128)
+CACHED_STATEMENTS = 256
+
+# Ajustes aplicados a cada conexão nova
+READ_PRAGMAS = (
+    "PRAGMA mmap_size = 268435456",   # 256 MB de leitura via mmap
+    "PRAGMA cache_size = -32768",     # 32 MB de cache de páginas
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA query_only = ON",
+)
+
+class ConnectionPool:
+    """
+    Pool de conexões SQLite abertas em modo somente leitura.
+
+    As conexões usam check_same_thread=False para circular entre as threads
+    do Streamlit, mas cada uma é entregue a uma única thread por vez.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre uma conexão somente leitura já configurada."""
+        uri = f"file:{quote(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Retorna uma conexão livre, criando uma nova enquanto houver vaga."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                conn = self._connect()
+                self._created += 1
+                return conn
+        return self._idle.get(timeout=POOL_TIMEOUT)
+
+    @contextmanager
+    def connection(self):
+        """
+        Empresta uma conexão do pool.
+
+        Uma conexão que falhou é descartada em vez de voltar ao pool. O
+        pd.read_sql_query embrulha os erros do sqlite3 em pd.errors.DatabaseError,
+        que não herda de sqlite3.Error, e por isso também é tratado aqui.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        except (sqlite3.Error, pd.errors.DatabaseError):
+            self._discard(conn)
+            raise
+        except BaseException:
+            self._release(conn)
+            raise
+        self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        """Devolve a conexão ao pool sem transação aberta."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        """Fecha uma conexão e libera sua vaga no pool."""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    def close_all(self):
+        """Fecha as conexões ociosas (ex.: antes de substituir o arquivo do banco)."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    """Pool único do processo, compartilhado entre reruns e sessões."""
+    return ConnectionPool()
@@ -0,0 +1,114 @@
+"""
+Backends de LLM usados por llm_session.
+
+query_groq e stream_groq falam com um backend em vez de falar direto com o
+cliente Groq, o que permite testar e medir o caminho da LLM sem chamar a
+API:
+  - GroqBackend: API Groq (produção);
+  - MockBackend: respostas simuladas, determinísticas, com latência
+    configurável e streaming em pedaços, inclusive um bloco <think>.
+
+Uso:
+    from llm_session import set_backend
+    set_backend(MockBackend(first_token_latency=0.5))
+"""
+
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterator, List, Optional, Sequence
+
+# Caracteres por token usados para simular o tempo de leitura do prompt
+CHARS_PER_TOKEN = 4
+
+class LLMBackend(ABC):
+    """Interface mínima de um backend de chat."""
+
+    name = "base"
+
+    def complete(self, messages: List[dict], model: str) -> str:
+        """Resposta completa (inclui blocos <think>, se o modelo os gerar)."""
+        return "".join(self.stream(messages, model))
+
+    @abstractmethod
+    def stream(self, messages: List[dict], model: str) -> Iterator[str]:
+        """Resposta em pedaços, na ordem em que chegam."""
+
+class GroqBackend(LLMBackend):
+    """
+    Backend da API Groq. Recebe uma função que fornece o cliente, criado
+    só na primeira consulta (ver llm_session.get_client).
+    """
+
+    name = "groq"
+
+    def __init__(self, client_factory: Callable):
+        self.client_factory = client_factory
+
+    def complete(self, messages: List[dict], model: str) -> str:
+        chat_completion = self.client_factory().chat.completions.create(messages=messages, model=model)
+        return chat_completion.choices[0].message.content
+
+    def stream(self, messages: List[dict], model: str) -> Iterator[str]:
+        chunks = self.client_factory().chat.completions.create(messages=messages, model=model, stream=True)
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+# Respostas simuladas; a escolha depende da última mensagem (contexto de
+# dados e pergunta), para ser reproduzível
+CANNED_RESPONSES = (
+    "**Conclusão Principal**\n\nO custo realizado ficou acima do orçado na maior parte "
+    "dos grupos, com desvio concentrado em poucas classes.\n\n**Cálculos de Suporte**\n\n"
+    "Δ = Orçado - Realizado; Δ% = Δ / Orçado x 100.",
+    "**Conclusão Principal**\n\nA taxa de utilização indica subutilização (U < 1.0) "
+    "nos equipamentos com maior desvio.\n\n| Classe | Δ% |\n|---|---|\n| TRAT.PNEU | 26 |",
+    "**Conclusão Principal**\n\nOs gastos com manutenção explicam a maior parte da "
+    "diferença entre orçado e realizado no período filtrado.",
+)
+
+class MockBackend(LLMBackend):
+    """
+    Backend local que simula um modelo de raciocínio.
+
+    A latência até o primeiro pedaço visível é first_token_latency mais o
+    tempo de leitura do prompt (prefill_per_1k_tokens a cada mil tokens), de
+    modo que contextos maiores demoram mais, como na API real.
+    """
+
+    name = "mock"
+
+    def __init__(self, first_token_latency: float = 0.2, prefill_per_1k_tokens: float = 0.05,
+                 chunk_interval: float = 0.005, chunk_size: int = 8,
+                 think_chunks: int = 5, responses: Optional[Sequence[str]] = None):
+        self.first_token_latency = first_token_latency
+        self.prefill_per_1k_tokens = prefill_per_1k_tokens
+        self.chunk_interval = chunk_interval
+        self.chunk_size = chunk_size
+        self.think_chunks = think_chunks
+        self.responses = tuple(responses or CANNED_RESPONSES)
+
+    def _response_for(self, messages: List[dict]) -> str:
+        """
+        Resposta escolhida pelo hash da última mensagem; como ela inclui o
+        contexto, a mesma pergunta com outros filtros pode ter outra resposta.
+        """
+        digest = hashlib.sha256(messages[-1]["content"].encode("utf-8")).digest()
+        return self.responses[digest[0] % len(self.responses)]
+
+    def _prefill_seconds(self, messages: List[dict]) -> float:
+        """Tempo simulado de leitura do prompt."""
+        tokens = sum(len(m["content"]) for m in messages) / CHARS_PER_TOKEN
+        return self.first_token_latency + tokens / 1000 * self.prefill_per_1k_tokens
+
+    def stream(self, messages: List[dict], model: str) -> Iterator[str]:
+        time.sleep(self._prefill_seconds(messages))
+        yield "<think>"
+        for _ in range(self.think_chunks):
+            time.sleep(self.chunk_interval)
+            yield "analisando os dados... "
+        yield "</think>"
+        response = self._response_for(messages)
+        for start in range(0, len(response), self.chunk_size):
+            time.sleep(self.chunk_interval)
+            yield response[start:start + self.chunk_size]
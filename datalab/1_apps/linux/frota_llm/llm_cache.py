@@ -0,0 +1,161 @@
+"""
+Cache persistente das respostas da LLM.
+
+A mesma pergunta sobre os mesmos dados (por exemplo, gestores diferentes
+consultando o mesmo mês) não precisa chamar a API de novo. As respostas ficam
+num SQLite próprio (llm_cache.db, separado do frota.db, que é somente
+leitura), com chave formada pelo modelo, pela pergunta normalizada e pelo
+hash do contexto de dados enviado no prompt. O arquivo fica fora do controle
+de versão; FROTA_LLM_CACHE_PATH muda o local.
+
+Entradas expiram após CACHE_TTL_SECONDS; quando o total de respostas passa
+de CACHE_MAX_BYTES, as menos acessadas recentemente são removidas.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Optional
+import streamlit as st
+
+# Arquivo do cache; FROTA_LLM_CACHE_PATH permite guardá-lo fora do diretório do código
+CACHE_PATH = os.environ.get(
+    "FROTA_LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.db"),
+)
+# Validade de uma resposta (segundos)
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Tamanho máximo somado das respostas guardadas (bytes)
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_respostas (
+        chave TEXT PRIMARY KEY,
+        modelo TEXT NOT NULL,
+        pergunta TEXT NOT NULL,
+        hash_contexto TEXT NOT NULL,
+        resposta TEXT NOT NULL,
+        tamanho INTEGER NOT NULL,
+        criado_em REAL NOT NULL,
+        acessado_em REAL NOT NULL
+    )
+"""
+INDEX = "CREATE INDEX IF NOT EXISTS ix_llm_respostas_acesso ON llm_respostas (acessado_em)"
+
+def normalize_question(question: str) -> str:
+    """Normaliza a pergunta: Unicode NFKC, sem diferença de caixa e espaços."""
+    question = unicodedata.normalize("NFKC", question).casefold()
+    return re.sub(r"\s+", " ", question).strip()
+
+def context_hash(context: str) -> str:
+    """Hash do contexto de dados enviado no prompt."""
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """Cache de respostas da LLM em SQLite, com validade e limite de tamanho."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL_SECONDS,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute(SCHEMA)
+                conn.execute(INDEX)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Conexão curta; o cache pode ser usado por várias sessões ao mesmo tempo."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @staticmethod
+    def make_key(model: str, question: str, context: str) -> str:
+        """Chave: modelo + pergunta normalizada + hash do contexto."""
+        partes = (model, normalize_question(question), context_hash(context))
+        return hashlib.sha256("\x00".join(partes).encode("utf-8")).hexdigest()
+
+    def get(self, model: str, question: str, context: str) -> Optional[str]:
+        """Resposta guardada e ainda válida, ou None."""
+        key = self.make_key(model, question, context)
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT resposta FROM llm_respostas WHERE chave = ? AND criado_em > ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE llm_respostas SET acessado_em = ? WHERE chave = ?", (now, key))
+            return row[0]
+        finally:
+            conn.close()
+
+    def put(self, model: str, question: str, context: str, response: str):
+        """Guarda a resposta e aplica a validade e o limite de tamanho."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO llm_respostas
+                        (chave, modelo, pergunta, hash_contexto, resposta, tamanho, criado_em, acessado_em)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(chave) DO UPDATE SET
+                        resposta = excluded.resposta,
+                        tamanho = excluded.tamanho,
+                        criado_em = excluded.criado_em,
+                        acessado_em = excluded.acessado_em
+                    """,
+                    (
+                        self.make_key(model, question, context), model, normalize_question(question),
+                        context_hash(context), response, len(response.encode("utf-8")), now, now,
+                    ),
+                )
+                self._evict(conn, now)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Remove as expiradas e, acima do limite, as acessadas há mais tempo."""
+        conn.execute("DELETE FROM llm_respostas WHERE criado_em <= ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM llm_respostas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Soma acumulada da mais recente para a mais antiga; remove o que excede o limite
+        conn.execute(
+            """
+            DELETE FROM llm_respostas WHERE chave IN (
+                SELECT chave FROM (
+                    SELECT chave, SUM(tamanho) OVER (ORDER BY acessado_em DESC) AS acumulado
+                    FROM llm_respostas
+                ) WHERE acumulado > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+
+    def clear(self):
+        """Remove todas as respostas."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM llm_respostas")
+        finally:
+            conn.close()
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Cache único do processo (o arquivo é compartilhado entre processos)."""
+    return ResponseCache()
@@ -0,0 +1,216 @@
+"""
+Montagem do contexto de dados enviado à LLM.
+
+Antes o dashboard enviava todos os registros filtrados e todas as linhas das
+quatro tabelas de fatos adicionais como JSON, repetindo os nomes das chaves
+em cada registro. Em filtros grandes isso estourava o limite de tokens e
+deixava as respostas lentas e caras.
+
+Aqui o contexto é um resumo em texto com tabelas CSV, montado por ordem de
+prioridade dentro de um orçamento de tokens:
+  1. totais gerais;
+  2. equipamentos com os maiores desvios (top-N);
+  3. totais das tabelas adicionais;
+  4. agregados por classe e usuário;
+  5. linhas das tabelas adicionais dos equipamentos do top-N.
+Cada seção tem uma fatia máxima do orçamento (SECTION_SHARES), para que uma
+seção longa não deixe as seguintes sem espaço; o que uma seção não usa fica
+para as próximas. Seções tabulares que não cabem são reduzidas (menos linhas)
+antes de serem omitidas.
+
+O desvio segue a convenção do prompt: delta_pct = (orçado - realizado) /
+orçado x 100, negativo quando o realizado passa do orçado.
+
+Uso:
+    context = build_context(df, additional_data, filtros, token_budget=6000)
+"""
+
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+# Orçamento padrão de tokens para o bloco de dados do prompt
+DEFAULT_TOKEN_BUDGET = 6000
+# Estimativa de caracteres por token (texto em português com números)
+CHARS_PER_TOKEN = 4
+# Quantidade inicial de equipamentos na seção de maiores desvios
+DEFAULT_TOP_N = 20
+# Menor quantidade de linhas antes de desistir de uma seção
+MIN_ROWS = 3
+# Fatia máxima do orçamento de cada seção, na ordem de montagem
+SECTION_SHARES = {
+    "totais": 1.0,
+    "maiores_desvios": 0.4,
+    "totais_adicionais": 0.35,
+    "grupos": 0.25,
+    "adicionais_top": 1.0,
+}
+
+# Colunas dos registros filtrados usadas no resumo, com os nomes do CSV
+DETAIL_COLUMNS = {
+    "id_equipamento": "equip",
+    "classe": "classe",
+    "usuario": "usuario",
+    "custo_hora_estimado": "custo_hora_orcado",
+    "custo_hora_realizado": "custo_hora_realizado",
+    "total_estimado": "total_orcado",
+    "total_realizado": "total_realizado",
+    "Taxa Utilização Multiplicador": "mult_custo_hora",
+    "Consumo Multiplicador": "mult_total",
+    "Sinalizador": "sinal",
+}
+
+# Colunas técnicas das tabelas adicionais que não entram no contexto
+ADDITIONAL_SKIP_COLUMNS = {"data_processamento"}
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa simples de tokens, sem depender do tokenizador do modelo."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _csv(df: pd.DataFrame) -> str:
+    """CSV compacto, com duas casas decimais."""
+    return df.to_csv(index=False, float_format="%.2f").strip()
+
+def _delta_pct(estimado, realizado) -> np.ndarray:
+    """Δ% do prompt: (orçado - realizado) / orçado x 100; 0 sem orçamento."""
+    estimado = np.asarray(estimado, dtype=float)
+    realizado = np.asarray(realizado, dtype=float)
+    return np.divide(
+        (estimado - realizado) * 100, estimado,
+        out=np.zeros_like(estimado), where=estimado != 0
+    )
+
+def _describe_filters(filtros: Optional[Dict]) -> str:
+    """Linha com os filtros aplicados no dashboard."""
+    if not filtros:
+        return "filtros: nenhum"
+    ativos = [
+        f"{nome}={', '.join(map(str, valor)) if isinstance(valor, (list, tuple)) else valor}"
+        for nome, valor in filtros.items() if valor
+    ]
+    return "filtros: " + ("; ".join(ativos) if ativos else "nenhum")
+
+def _totals_section(df: pd.DataFrame, filtros: Optional[Dict]) -> str:
+    """Totais gerais dos registros filtrados."""
+    estimado = df["total_estimado"].sum()
+    realizado = df["total_realizado"].sum()
+    linhas = [
+        "## Totais",
+        _describe_filters(filtros),
+        f"registros: {len(df)}; equipamentos: {df['id_equipamento'].nunique()}",
+        f"total_orcado: {estimado:.2f}; total_realizado: {realizado:.2f}; "
+        f"delta_pct (orcado-realizado)/orcado: {float(_delta_pct(estimado, realizado)):.1f}",
+    ]
+    if "Sinalizador" in df.columns:
+        contagem = df["Sinalizador"].value_counts()
+        linhas.append("sinalizadores: " + "; ".join(f"{k}={v}" for k, v in contagem.items()))
+    return "\n".join(linhas)
+
+def _group_section(df: pd.DataFrame, limit: int) -> str:
+    """Agregados por classe e usuário, os de maior desvio absoluto primeiro."""
+    grupos = (
+        df.groupby(["classe", "usuario"], dropna=False)
+        .agg(
+            equipamentos=("id_equipamento", "nunique"),
+            total_orcado=("total_estimado", "sum"),
+            total_realizado=("total_realizado", "sum"),
+        )
+        .reset_index()
+    )
+    grupos["delta_pct"] = _delta_pct(grupos["total_orcado"], grupos["total_realizado"])
+    ordem = (grupos["total_realizado"] - grupos["total_orcado"]).abs().sort_values(ascending=False).index
+    grupos = grupos.loc[ordem]
+    titulo = f"## Por classe e usuário ({min(limit, len(grupos))} de {len(grupos)} grupos, maiores desvios primeiro)"
+    return f"{titulo}\n{_csv(grupos.head(limit))}"
+
+def _top_equipment(df: pd.DataFrame, limit: int) -> pd.DataFrame:
+    """Equipamentos com maior desvio absoluto do total."""
+    desvio = (df["total_realizado"] - df["total_estimado"]).abs()
+    return df.loc[desvio.sort_values(ascending=False).index[:limit]]
+
+def _top_section(df: pd.DataFrame, limit: int) -> str:
+    """Registros dos equipamentos com maiores desvios."""
+    top = _top_equipment(df, limit)
+    colunas = [c for c in DETAIL_COLUMNS if c in top.columns]
+    detalhe = top[colunas].rename(columns=DETAIL_COLUMNS)
+    detalhe["delta_pct"] = _delta_pct(top["total_estimado"], top["total_realizado"])
+    return f"## Maiores desvios (top {len(top)} de {len(df)} registros)\n{_csv(detalhe)}"
+
+def _additional_frames(additional_data: Dict) -> Dict[str, pd.DataFrame]:
+    """Tabelas adicionais (formato colunar) como DataFrames."""
+    frames = {}
+    for tabela, colunas in (additional_data or {}).items():
+        frame = pd.DataFrame(colunas)
+        frames[tabela] = frame.drop(columns=[c for c in ADDITIONAL_SKIP_COLUMNS if c in frame.columns])
+    return frames
+
+def _additional_totals_section(frames: Dict[str, pd.DataFrame]) -> str:
+    """Soma das colunas numéricas de cada tabela adicional."""
+    partes = ["## Totais das tabelas adicionais"]
+    for tabela, frame in frames.items():
+        numericas = frame.select_dtypes(include="number").drop(columns=["id_equipamento"], errors="ignore")
+        if frame.empty or numericas.empty:
+            partes.append(f"{tabela}: sem registros")
+            continue
+        partes.append(f"{tabela} ({len(frame)} registros)\n{_csv(numericas.sum().to_frame().T)}")
+    return "\n".join(partes)
+
+def _additional_top_section(frames: Dict[str, pd.DataFrame], ids: List, limit: int) -> str:
+    """Linhas das tabelas adicionais dos equipamentos com maiores desvios."""
+    ids = ids[:limit]
+    partes = [f"## Tabelas adicionais dos {len(ids)} equipamentos com maiores desvios"]
+    for tabela, frame in frames.items():
+        if frame.empty:
+            continue
+        partes.append(f"{tabela}\n{_csv(frame[frame['id_equipamento'].isin(ids)])}")
+    return "\n".join(partes)
+
+def _fit(render: Callable[[int], str], limit: int, remaining: int) -> Optional[str]:
+    """Reduz o número de linhas da seção pela metade até caber no orçamento."""
+    while True:
+        text = render(limit)
+        if estimate_tokens(text) <= remaining:
+            return text
+        if limit <= MIN_ROWS:
+            return None
+        limit = max(MIN_ROWS, limit // 2)
+
+def build_context(df: pd.DataFrame, additional_data: Optional[Dict] = None,
+                  filtros: Optional[Dict] = None,
+                  token_budget: int = DEFAULT_TOKEN_BUDGET,
+                  top_n: int = DEFAULT_TOP_N) -> str:
+    """
+    Monta o contexto de dados para a LLM dentro do orçamento de tokens.
+
+    Args:
+        df: Registros filtrados (colunas de custo, classe, usuário e, se
+            houver, multiplicadores e sinalizador)
+        additional_data: Tabelas adicionais no formato colunar de db_access
+        filtros: Filtros aplicados, apenas para descrição
+        token_budget: Máximo estimado de tokens do contexto
+        top_n: Equipamentos na seção de maiores desvios
+    Returns:
+        str: Contexto em texto com tabelas CSV
+    """
+    if df is None or df.empty:
+        return "Nenhum registro encontrado para os filtros aplicados."
+
+    frames = _additional_frames(additional_data)
+    top_ids = _top_equipment(df, top_n)["id_equipamento"].drop_duplicates().tolist()
+    sections = [
+        ("totais", lambda limit: _totals_section(df, filtros), 1),
+        ("maiores_desvios", lambda limit: _top_section(df, limit), top_n),
+        ("totais_adicionais", lambda limit: _additional_totals_section(frames), 1),
+        ("grupos", lambda limit: _group_section(df, limit), len(df)),
+        ("adicionais_top", lambda limit: _additional_top_section(frames, top_ids, limit), len(top_ids)),
+    ]
+
+    parts = []
+    remaining = token_budget
+    for name, render, limit in sections:
+        text = _fit(render, limit, min(remaining, int(token_budget * SECTION_SHARES[name])))
+        if text is None:
+            continue
+        parts.append(text)
+        remaining -= estimate_tokens(text)
+    return "\n\n".join(parts)
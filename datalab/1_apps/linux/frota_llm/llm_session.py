@@ -1,19 +1,83 @@
+import os
 import re
+import threading
 import streamlit as st
 from groq import Groq
+from llm_backends import GroqBackend, LLMBackend, MockBackend
+from llm_cache import get_response_cache
 
-# Configura o cliente Groq utilizando a chave armazenada nos secrets
-api_key = st.secrets["GROQ_API_KEY"]
-client = Groq(api_key=api_key)
+# Cliente Groq criado no primeiro uso, para que o módulo possa ser importado
+# sem secrets (testes, benchmark, jobs em lote)
+_client = None
+_client_lock = threading.Lock()
 
-def query_groq(data_json: dict, question: str, model_name: str = "deepseek-r1-distill-llama-70b") -> str:
+def get_api_key() -> str:
     """
-    Processa uma consulta utilizando a API GROQ.
-    Monta o prompt com informações do dataset e da query do usuário,
-    e retorna a resposta da LLM.
+    Chave da API Groq: st.secrets["GROQ_API_KEY"] ou, na falta dele, a
+    variável de ambiente GROQ_API_KEY.
     """
     try:
-        prompt = f"""
+        return st.secrets["GROQ_API_KEY"]
+    except Exception:
+        api_key = os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            raise RuntimeError(
+                "GROQ_API_KEY não encontrada em st.secrets nem nas variáveis de ambiente."
+            )
+        return api_key
+
+def get_client() -> Groq:
+    """Cliente Groq, criado na primeira chamada."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Groq(api_key=get_api_key())
+    return _client
+
+def reset_client():
+    """Descarta o cliente (ex.: após trocar a chave); o próximo uso cria outro."""
+    global _client
+    with _client_lock:
+        _client = None
+
+def __getattr__(name):
+    # Compatibilidade com quem usava llm_session.client / llm_session.api_key
+    if name == "client":
+        return get_client()
+    if name == "api_key":
+        return get_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Backend em uso; FROTA_LLM_BACKEND=mock usa respostas simuladas
+_backend = None
+
+def get_backend() -> LLMBackend:
+    """
+    Backend de LLM usado pelas consultas (Groq, salvo configuração em contrário).
+    """
+    global _backend
+    if _backend is None:
+        if os.environ.get("FROTA_LLM_BACKEND", "groq").lower() == "mock":
+            _backend = MockBackend()
+        else:
+            _backend = GroqBackend(get_client)
+    return _backend
+
+def set_backend(backend: LLMBackend):
+    """Troca o backend (testes e benchmark); None volta ao padrão."""
+    global _backend
+    _backend = backend
+
+# Marcadores do raciocínio interno dos modelos de raciocínio (ex.: deepseek-r1)
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+def build_messages(context: str, question: str) -> list:
+    """
+    Monta as mensagens do chat com o resumo dos dados e a pergunta do usuário.
+    """
+    prompt = f"""
         # Você é um especialista em gestão de frota de maquinário agrícola, com foco em análise financeira dos valores dos orçamentos e custos realizados e cálculos de eficiência operacional.
         ## Sua única habilidade é explicar as relações existentes entre valores orçados e valores realizados, apresentando os resulatdos dos seus cálculos de forma clara e objetiva.
         
@@ -80,31 +144,138 @@ def query_groq(data_json: dict, question: str, model_name: str = "deepseek-r1-di
         ---
 
         **Dataset Provided:**
-        ```json
-        {data_json}
+        (resumo dos dados filtrados; tabelas em CSV, valores monetários em R$)
+        ```text
+        {context}
         ```
 
         **User Query:**
         ```text
         {question}
         ```
-        """
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a highly specialized assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            model=model_name,
-        )
-        response = chat_completion.choices[0].message.content
+    """
+    return [
+        {"role": "system", "content": "You are a highly specialized assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+class ThinkFilter:
+    """
+    Remove blocos <think>...</think> de um texto recebido em pedaços.
+
+    Máquina de estados com dois estados (fora/dentro do bloco). Um pedaço que
+    termina com o início de um marcador fica retido até o próximo pedaço, pois
+    o marcador pode chegar dividido. Se o texto terminar com um bloco aberto e
+    não fechado, o bloco é devolvido como texto, como na versão sem streaming.
+    """
+
+    def __init__(self):
+        self.inside = False
+        self.pending = ""
+        self.hidden = ""
+
+    @staticmethod
+    def _partial_tag(text: str, tag: str) -> int:
+        """Tamanho do maior sufixo de text que é prefixo de tag."""
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:size]):
+                return size
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        """Processa um pedaço e devolve o texto visível liberado por ele."""
+        text = self.pending + chunk
+        self.pending = ""
+        visible = []
+        while text:
+            tag = THINK_CLOSE if self.inside else THINK_OPEN
+            position = text.find(tag)
+            if position >= 0:
+                if self.inside:
+                    self.hidden = ""
+                else:
+                    visible.append(text[:position])
+                self.inside = not self.inside
+                text = text[position + len(tag):]
+                continue
+            keep = self._partial_tag(text, tag)
+            ready, self.pending = text[:len(text) - keep], text[len(text) - keep:]
+            if self.inside:
+                self.hidden += ready
+            else:
+                visible.append(ready)
+            break
+        return "".join(visible)
+
+    def finish(self) -> str:
+        """Libera o que ficou retido ao fim do texto."""
+        if self.inside:
+            rest = THINK_OPEN + self.hidden + self.pending
+        else:
+            rest = self.pending
+        self.inside, self.pending, self.hidden = False, "", ""
+        return rest
+
+def query_groq(context: str, question: str, model_name: str = "deepseek-r1-distill-llama-70b",
+               use_cache: bool = True) -> str:
+    """
+    Processa uma consulta utilizando a API GROQ.
+    Monta o prompt com o resumo dos dados (ver llm_context.build_context)
+    e a query do usuário, e retorna a resposta da LLM.
+    A mesma pergunta sobre o mesmo contexto é respondida pelo cache
+    persistente (llm_cache), sem chamar a API.
+    """
+    try:
+        cache = get_response_cache() if use_cache else None
+        if cache is not None:
+            cached = cache.get(model_name, question, context)
+            if cached is not None:
+                return cached
+
+        response = get_backend().complete(build_messages(context, question), model_name)
 
         # Remove trechos de raciocínio interno (ex.: <think>...</think>)
-        if "<think>" in response and "</think>" in response:
+        if THINK_OPEN in response and THINK_CLOSE in response:
             cleaned_response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
         else:
             cleaned_response = response
 
+        if cache is not None:
+            cache.put(model_name, question, context, cleaned_response)
         return cleaned_response
     except Exception as e:
         st.error(f"Erro ao comunicar com a API GROQ: {e}")
         return "Erro ao processar a consulta."
+
+def stream_groq(context: str, question: str, model_name: str = "deepseek-r1-distill-llama-70b",
+                use_cache: bool = True):
+    """
+    Variante de query_groq que entrega a resposta em pedaços, à medida que
+    chegam da API, já sem os blocos <think>. Própria para st.write_stream.
+    A resposta completa é gravada no cache ao final.
+    """
+    try:
+        cache = get_response_cache() if use_cache else None
+        if cache is not None:
+            cached = cache.get(model_name, question, context)
+            if cached is not None:
+                yield cached
+                return
+
+        think_filter = ThinkFilter()
+        answer = []
+        for piece in get_backend().stream(build_messages(context, question), model_name):
+            visible = think_filter.feed(piece)
+            if visible:
+                answer.append(visible)
+                yield visible
+        rest = think_filter.finish()
+        if rest:
+            answer.append(rest)
+            yield rest
+
+        if cache is not None:
+            cache.put(model_name, question, context, "".join(answer))
+    except Exception as e:
+        st.error(f"Erro ao comunicar com a API GROQ: {e}")
+        yield "Erro ao processar a consulta."
@@ -0,0 +1,88 @@
+"""
+Construtor de filtros SQL parametrizados para o dashboard.
+
+Substitui as duas versões de build_filters (db_access e db_filters), que
+interpolavam datas, ids, usuários e classes no texto da query. Aqui o texto
+da cláusula WHERE é sempre o mesmo para um par de aliases; os valores vão
+como parâmetros nomeados e as listas do IN são passadas como um único array
+JSON expandido por json_each. Assim cada query é preparada uma vez e
+reaproveitada do cache de comandos da conexão, qualquer que seja o filtro.
+
+Uso:
+    where, params = build_filters(filtros, alias='ag', dim_alias='ag')
+    conn.execute(f"SELECT ... FROM agg_custo_equipamento_mensal AS ag WHERE {where}", params)
+"""
+
+import json
+from typing import Dict, Optional, Tuple
+
+# Limites usados quando o período não é filtrado; mantêm o BETWEEN (e o
+# índice por data_referencia) sem mudar o texto da query
+MIN_DATE = "0000-01-01"
+MAX_DATE = "9999-12-31"
+
+DATE_FILTER_TEMPLATE = "{alias}.data_referencia BETWEEN :data_inicio AND :data_fim"
+
+# Cada filtro ausente recebe NULL e a condição correspondente vira verdadeira
+EQUIPMENT_FILTER_TEMPLATE = (
+    "(:ids IS NULL OR {alias}.id_equipamento IN (SELECT value FROM json_each(:ids)))"
+    " AND (:usuarios IS NULL OR {dim_alias}.usuario IN (SELECT value FROM json_each(:usuarios)))"
+    " AND (:classes IS NULL OR {dim_alias}.classe IN (SELECT value FROM json_each(:classes)))"
+)
+
+FILTER_TEMPLATE = DATE_FILTER_TEMPLATE + " AND " + EQUIPMENT_FILTER_TEMPLATE
+
+# Parâmetros que restringem o conjunto de equipamentos
+EQUIPMENT_PARAMS = ("ids", "usuarios", "classes")
+
+def _json_list(values, ignore: Optional[str] = None) -> Optional[str]:
+    """
+    Serializa a lista de um filtro IN; None quando não há filtro.
+    O valor `ignore` (ex.: "Todos") desativa o filtro, como no dashboard.
+    """
+    if not values or (ignore is not None and ignore in values):
+        return None
+    return json.dumps(list(values), ensure_ascii=False)
+
+def filter_params(filtros: Dict) -> Dict[str, Optional[str]]:
+    """
+    Converte o dicionário de filtros do dashboard nos parâmetros nomeados
+    esperados por FILTER_TEMPLATE.
+    """
+    start_date, end_date = MIN_DATE, MAX_DATE
+    data_referencia = filtros.get("data_referencia")
+    if data_referencia and len(data_referencia) == 2:
+        start_date, end_date = (str(d) for d in data_referencia)
+    ids = filtros.get("id_equipamento")
+    return {
+        "data_inicio": start_date,
+        "data_fim": end_date,
+        "ids": _json_list([int(i) for i in ids] if ids else None),
+        "usuarios": _json_list(filtros.get("usuario"), ignore="Todos"),
+        "classes": _json_list(filtros.get("classe"), ignore="Todos"),
+    }
+
+def build_filters(filtros: Dict, alias: str = 'fc', dim_alias: str = 'de') -> Tuple[str, Dict[str, Optional[str]]]:
+    """
+    Constrói a cláusula WHERE parametrizada a partir dos filtros.
+    O alias indica a tabela de fatos (data e equipamento) e o dim_alias a
+    tabela que contém usuario e classe.
+
+    Returns:
+        Tuple[str, Dict]: Texto da condição (sem WHERE) e parâmetros nomeados
+    """
+    return FILTER_TEMPLATE.format(alias=alias, dim_alias=dim_alias), filter_params(filtros)
+
+def build_equipment_filters(filtros: Dict, alias: str = 'de') -> Tuple[str, Dict[str, Optional[str]]]:
+    """
+    Constrói a condição sobre dim_equipamento (ids, usuários e classes), para
+    obter o conjunto de equipamentos filtrados uma única vez.
+
+    Returns:
+        Tuple[str, Dict]: Texto da condição (sem WHERE) e parâmetros nomeados
+    """
+    return EQUIPMENT_FILTER_TEMPLATE.format(alias=alias, dim_alias=alias), filter_params(filtros)
+
+def has_equipment_filters(params: Dict[str, Optional[str]]) -> bool:
+    """Indica se os parâmetros restringem o conjunto de equipamentos."""
+    return any(params.get(name) is not None for name in EQUIPMENT_PARAMS)
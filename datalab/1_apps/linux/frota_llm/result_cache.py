@@ -0,0 +1,166 @@
+"""
+Cache de resultados das consultas do dashboard.
+
+O Streamlit reexecuta o script inteiro a cada interação, inclusive quando só
+o texto da pergunta à LLM mudou. As consultas de db_access passam por este
+cache, cuja chave combina o nome da consulta, os filtros normalizados e a
+geração do banco (data de modificação e tamanho de frota.db e do seu -wal).
+Uma carga do ETL muda a geração e invalida tudo automaticamente.
+
+O cache é LRU, limitado pelo tamanho estimado dos resultados, e devolve
+sempre cópias para que quem chama possa alterar o DataFrame à vontade.
+"""
+
+import copy
+import functools
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import date
+import pandas as pd
+import streamlit as st
+from db_pool import DB_PATH
+
+# Memória máxima ocupada pelos resultados em cache (bytes)
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+def db_generation(db_path: str = DB_PATH) -> tuple:
+    """
+    Identifica a versão dos dados pelo mtime e tamanho do banco e do WAL.
+    Commits em modo WAL alteram o arquivo -wal antes do checkpoint.
+    """
+    generation = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            generation.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            generation.append(None)
+    return tuple(generation)
+
+# Filtros cuja ordem dos valores importa (intervalo início/fim)
+ORDERED_FILTERS = {"data_referencia"}
+
+def _normalize(value, ordered: bool = False):
+    """Converte um valor de filtro em forma hashable; listas viram conjuntos ordenados."""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v, k in ORDERED_FILTERS)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        return tuple(items) if ordered else tuple(sorted(set(items), key=repr))
+    return value
+
+def normalize_filters(filtros: dict) -> tuple:
+    """Chave estável para o dicionário de filtros; filtros vazios são ignorados."""
+    return _normalize({
+        name: value for name, value in filtros.items()
+        if value is not None and not (hasattr(value, "__len__") and len(value) == 0)
+    })
+
+def _estimate_size(value) -> int:
+    """Tamanho aproximado de um resultado em memória."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _copy(value):
+    """Cópia entregue a quem chama, para não expor o objeto em cache."""
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    return copy.deepcopy(value)
+
+class ResultCache:
+    """Cache LRU thread-safe limitado pelo tamanho estimado dos valores."""
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.generation = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna (True, cópia do valor) ou (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[0]
+        return True, _copy(value)
+
+    def put(self, key, value):
+        """Guarda o valor, descartando os menos usados para respeitar o limite."""
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        stored = _copy(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (stored, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def sync_generation(self, generation: tuple):
+        """Descarta os resultados de gerações anteriores do banco."""
+        with self._lock:
+            if generation != self.generation:
+                self._entries.clear()
+                self.current_bytes = 0
+                self.generation = generation
+
+    def clear(self):
+        """Esvazia o cache."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """Contadores para diagnóstico."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    """Cache único do processo, compartilhado entre reruns e sessões."""
+    return ResultCache()
+
+def cached_query(func):
+    """
+    Decora uma consulta de db_access cujos argumentos são filtros ou valores
+    simples. Exceções não são cacheadas.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        generation = db_generation()
+        key = (
+            func.__name__,
+            tuple(normalize_filters(a) if isinstance(a, dict) else _normalize(a) for a in args),
+            normalize_filters(kwargs),
+            generation,
+        )
+        cache = get_result_cache()
+        cache.sync_generation(generation)
+        found, value = cache.get(key)
+        if found:
+            return value
+        value = func(*args, **kwargs)
+        cache.put(key, value)
+        return value
+    return wrapper
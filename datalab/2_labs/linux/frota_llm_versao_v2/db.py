@@ -1,6 +1,98 @@
+import re
 import sqlite3
 import logging
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List
+
+# Dependências opcionais de fetch_columns
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Limites padrão da execução de consultas em execute_query
+QUERY_TIMEOUT_SECONDS = 5.0   # Tempo máximo de execução (incluindo a leitura das linhas)
+MAX_ROWS = 10000              # Máximo de linhas retornadas
+FETCH_SIZE = 500              # Linhas lidas por vez do cursor (execute_query, iter_query e fetch_columns)
+PROGRESS_STEPS = 10000        # Instruções da VM do SQLite entre verificações do tempo
+SLOW_QUERY_SECONDS = 0.5      # Consultas a partir deste tempo são registradas como lentas (WARNING)
+MAX_STATS_ENTRIES = 500       # Formas de consulta mantidas em query_stats (a menos usada recentemente sai primeiro)
+
+# Literais de texto e números, trocados por ? na chave das estatísticas
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Operações que o autorizador permite em execute_query; qualquer outra é negada
+ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+# Tabelas de fatos consideradas em get_date_defaults
+FACT_TABLES = ("fato_custo", "fato_combustivel", "fato_manutencao", "fato_reforma", "fato_uso")
+
+# Limites mantidos pelo ETL em meta_fatos, uma linha por tabela de fatos
+DATE_BOUNDS_META_QUERY = """
+    SELECT MIN(min_data_referencia) AS min_data_referencia,
+           MAX(max_data_referencia) AS max_data_referencia,
+           MIN(min_data_processamento) AS min_data_processamento,
+           MAX(max_data_processamento) AS max_data_processamento,
+           COUNT(*) AS tabelas
+    FROM meta_fatos
+"""
+
+# Bancos sem meta_fatos: MIN/MAX em subconsultas separadas por tabela e coluna.
+# As de data_referencia usam o índice da coluna quando ele existe; as de
+# data_processamento não têm índice e varrem cada tabela de fatos.
+DATE_BOUNDS_FALLBACK_QUERY = """
+    SELECT MIN(min_data_referencia) AS min_data_referencia,
+           MAX(max_data_referencia) AS max_data_referencia,
+           MIN(min_data_processamento) AS min_data_processamento,
+           MAX(max_data_processamento) AS max_data_processamento
+    FROM ({bounds})
+""".format(bounds=" UNION ALL ".join(
+    f"SELECT (SELECT MIN(data_referencia) FROM {table}) AS min_data_referencia, "
+    f"(SELECT MAX(data_referencia) FROM {table}) AS max_data_referencia, "
+    f"(SELECT MIN(data_processamento) FROM {table}) AS min_data_processamento, "
+    f"(SELECT MAX(data_processamento) FROM {table}) AS max_data_processamento"
+    for table in FACT_TABLES
+))
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    """
+    Autorizador do SQLite: libera apenas leitura (SELECT, leitura de colunas, funções e CTEs recursivas).
+    """
+    return sqlite3.SQLITE_OK if action in ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+def _is_read_query(query: str) -> bool:
+    """
+    Verificação inicial: a consulta começa com SELECT ou WITH (CTE). O autorizador
+    continua sendo a proteção efetiva, inclusive para um WITH seguido de escrita.
+    """
+    return query.strip().lower().startswith(("select", "with"))
+
+def _compact(query: str) -> str:
+    """
+    Texto da consulta em uma linha, para logs e estatísticas.
+    """
+    return " ".join(query.split())
+
+@lru_cache(maxsize=MAX_STATS_ENTRIES)
+def _normalize(query: str) -> str:
+    """
+    Chave das estatísticas: o texto compactado com os literais trocados por ?, para que
+    consultas que só diferem nos valores (comuns nas geradas pelo modelo) somem juntas.
+    """
+    return LITERAL_PATTERN.sub("?", _compact(query))
 
 class Database:
     """
@@ -37,128 +129,345 @@ class Database:
     - fato_reforma.id_equipamento     -> dim_equipamento.id_equipamento
     """
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, timeout_seconds: float = QUERY_TIMEOUT_SECONDS, max_rows: int = MAX_ROWS,
+                 slow_query_seconds: float = SLOW_QUERY_SECONDS, max_stats_entries: int = MAX_STATS_ENTRIES):
         """
         Inicializa a classe Database com o caminho para o banco de dados.
 
+        O nível e os handlers do logger ficam a cargo da aplicação (logging.basicConfig etc.);
+        as mensagens de DEBUG só são formatadas quando esse nível está habilitado.
+
         :param db_path: Caminho para o arquivo SQLite.
+        :param timeout_seconds: Tempo máximo de uma consulta em execute_query.
+        :param max_rows: Máximo de linhas retornadas por execute_query.
+        :param slow_query_seconds: Tempo a partir do qual uma consulta é registrada como lenta.
+        :param max_stats_entries: Máximo de formas de consulta mantidas em query_stats.
         """
         self.db_path = db_path
+        self.timeout_seconds = timeout_seconds
+        self.max_rows = max_rows
+        # Uma conexão somente leitura por thread, aberta no primeiro uso e reaproveitada
+        self._local = threading.local()
+        self.slow_query_seconds = slow_query_seconds
         self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
-        # Configuração básica do logger (pode ser ajustada conforme necessidade)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        if not self.logger.hasHandlers():
-            self.logger.addHandler(handler)
+        # Estatísticas acumuladas por forma de consulta (ver _normalize e query_stats),
+        # em ordem de uso para descartar a menos recente ao passar de max_stats_entries
+        self.max_stats_entries = max_stats_entries
+        self._stats: "OrderedDict[str, Dict]" = OrderedDict()
+        self._stats_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Retorna a conexão somente leitura da thread atual, abrindo-a no primeiro uso.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)  # 🔹 Ativa modo READ-ONLY
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self.logger.debug("Conexão com o banco aberta.")
+        return conn
 
     @contextmanager
     def get_connection(self):
         """
-        Context manager para criar uma conexão apenas para leitura.
+        Context manager que fornece a conexão apenas para leitura da thread atual.
+        A conexão é aberta uma vez e reaproveitada entre as consultas; use close() para fechá-la.
         """
-        conn = None
         try:
-            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)  # 🔹 Ativa modo READ-ONLY
-            conn.row_factory = sqlite3.Row
-            yield conn
+            yield self._connection()
         except sqlite3.Error as e:
-            self.logger.error(f"Erro ao conectar com o banco: {e}")
+            self.logger.error("Erro ao conectar com o banco: %s", e)
             raise
-        finally:
-            if conn:
-                conn.close()
-                self.logger.debug("Conexão com o banco fechada.")
 
-    def execute_query(self, query: str, params: tuple = None):
+    def close(self):
+        """
+        Fecha a conexão da thread atual (a próxima consulta abre outra).
         """
-        Executa apenas consultas (SELECT) no banco de dados.
-        
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+            self.logger.debug("Conexão com o banco fechada.")
+
+    def execute_query(self, query: str, params: tuple = None, max_rows: int = None):
+        """
+        Executa apenas consultas (SELECT, inclusive com WITH) no banco de dados, isoladas para consultas
+        geradas pela IA ou pelo usuário:
+        - o autorizador do SQLite nega qualquer operação que não seja leitura;
+        - um progress handler interrompe a consulta que passar de timeout_seconds;
+        - as linhas são lidas em blocos e a leitura para em max_rows.
+
         :param query: Instrução SQL de leitura.
         :param params: Parâmetros para a consulta.
-        :return: Cursor com os resultados da execução.
+        :param max_rows: Máximo de linhas (padrão: self.max_rows); o excedente é descartado.
+        :return: Lista de sqlite3.Row com os resultados.
+        :raises PermissionError: Se a consulta não for SELECT ou tentar uma operação não autorizada.
+        :raises TimeoutError: Se a consulta exceder o tempo máximo.
         """
-        if not query.strip().lower().startswith("select"):  # 🔹 Bloqueia qualquer coisa que não seja SELECT
-            self.logger.error(f"Tentativa de modificação do banco bloqueada: {query}")
+        if not _is_read_query(query):  # 🔹 Bloqueia qualquer coisa que não seja SELECT
+            self.logger.error("Tentativa de modificação do banco bloqueada: %s", query)
             raise PermissionError("Modificação no banco não permitida! Apenas consultas são permitidas.")
+        max_rows = self.max_rows if max_rows is None else max_rows
 
         with self.get_connection() as conn:
+            deadline = time.monotonic() + self.timeout_seconds
+            conn.set_authorizer(_authorizer)
+            # Retornar verdadeiro interrompe a instrução em execução
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
             cursor = conn.cursor()
             try:
-                self.logger.debug(f"Executando consulta: {query} com parâmetros: {params}")
-                cursor.execute(query, params)
-                results = cursor.fetchall()
+                self.logger.debug("Executando consulta: %s com parâmetros: %s", query, params)
+                start = time.perf_counter()
+                cursor.execute(query, params or ())
+                results = []
+                while len(results) < max_rows:
+                    rows = cursor.fetchmany(min(FETCH_SIZE, max_rows - len(results)))
+                    if not rows:
+                        break
+                    results.extend(rows)
+                else:
+                    if cursor.fetchone() is not None:
+                        self.logger.warning("Resultado limitado a %d linhas.\nQuery: %s", max_rows, query)
+                self._record(query, time.perf_counter() - start, len(results))
                 return results
-            except sqlite3.Error as e:
-                self.logger.error(f"Erro na execução da consulta: {e}\nQuery: {query}\nParâmetros: {params}")
+            except sqlite3.DatabaseError as e:
+                if time.monotonic() > deadline:
+                    self.logger.error("Consulta interrompida após %ss.\nQuery: %s", self.timeout_seconds, query)
+                    raise TimeoutError(f"Consulta excedeu o tempo máximo de {self.timeout_seconds} segundos.") from e
+                if "not authorized" in str(e):
+                    self.logger.error("Operação não autorizada bloqueada: %s\nQuery: %s", e, query)
+                    raise PermissionError("Operação não permitida! Apenas leituras são permitidas.") from e
+                self.logger.error("Erro na execução da consulta: %s\nQuery: %s\nParâmetros: %s", e, query, params)
                 raise
+            finally:
+                cursor.close()
+                # A conexão é reaproveitada: remove os limites desta consulta
+                conn.set_progress_handler(None, 0)
+                conn.set_authorizer(None)
+
+    def _read_cursor(self, query: str, params: tuple = None) -> sqlite3.Cursor:
+        """
+        Prepara uma consulta (SELECT) na conexão da thread e retorna o cursor, sem ler linhas.
+        Operações que não sejam leitura são negadas pelo autorizador, como em execute_query.
+        """
+        if not _is_read_query(query):
+            self.logger.error("Tentativa de modificação do banco bloqueada: %s", query)
+            raise PermissionError("Modificação no banco não permitida! Apenas consultas são permitidas.")
+
+        with self.get_connection() as conn:
+            conn.set_authorizer(_authorizer)
+            try:
+                self.logger.debug("Executando consulta: %s com parâmetros: %s", query, params)
+                return conn.execute(query, params or ())
+            except sqlite3.DatabaseError as e:
+                self.logger.error("Erro na execução da consulta: %s\nQuery: %s\nParâmetros: %s", e, query, params)
+                if "not authorized" in str(e):
+                    raise PermissionError("Operação não permitida! Apenas leituras são permitidas.") from e
+                raise
+            finally:
+                # O autorizador só atua na preparação da instrução
+                conn.set_authorizer(None)
+
+    def iter_query(self, query: str, params: tuple = None, chunk_size: int = FETCH_SIZE) -> Iterator[List[sqlite3.Row]]:
+        """
+        Executa uma consulta (SELECT) e entrega o resultado em blocos de até chunk_size linhas,
+        sem carregar tudo em memória (exportações e varreduras grandes). Ao contrário de
+        execute_query, não há limite de tempo nem de linhas.
+
+        :param query: Instrução SQL de leitura.
+        :param params: Parâmetros para a consulta.
+        :param chunk_size: Linhas por bloco.
+        :return: Iterador de listas de sqlite3.Row.
+        """
+        start = time.perf_counter()
+        cursor = self._read_cursor(query, params)
+        total = 0
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                total += len(rows)
+                yield rows
+        finally:
+            cursor.close()
+            # Inclui o tempo de quem consome os blocos
+            self._record(query, time.perf_counter() - start, total)
+
+    def fetch_columns(self, query: str, params: tuple = None, chunk_size: int = FETCH_SIZE, as_arrow: bool = False):
+        """
+        Executa uma consulta (SELECT) e devolve o resultado em formato colunar, lendo em blocos
+        e sem criar um sqlite3.Row por linha.
+
+        Colunas numéricas viram arrays NumPy (float com NaN quando há nulos); as demais, arrays
+        de objetos. Com as_arrow=True o retorno é uma pyarrow.Table.
+
+        :param query: Instrução SQL de leitura.
+        :param params: Parâmetros para a consulta.
+        :param chunk_size: Linhas lidas por vez.
+        :param as_arrow: Retorna pyarrow.Table em vez de dicionário de arrays NumPy.
+        :return: Dict[str, numpy.ndarray] ou pyarrow.Table.
+        """
+        if as_arrow and pa is None:
+            raise ImportError("pyarrow não está instalado; use as_arrow=False.")
+        if not as_arrow and np is None:
+            raise ImportError("numpy não está instalado.")
+
+        start = time.perf_counter()
+        cursor = self._read_cursor(query, params)
+        cursor.row_factory = None  # Tuplas simples, mais leves que sqlite3.Row
+        try:
+            names = [d[0] for d in cursor.description]
+            columns: Dict[str, list] = {name: [] for name in names}
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for name, values in zip(names, zip(*rows)):
+                    columns[name].extend(values)
+        finally:
+            cursor.close()
+        self._record(query, time.perf_counter() - start, len(columns[names[0]]) if names else 0)
+
+        if as_arrow:
+            return pa.table({name: pa.array(values) for name, values in columns.items()})
+        return {name: self._to_array(values) for name, values in columns.items()}
+
+    @staticmethod
+    def _to_array(values: list):
+        """
+        Converte os valores de uma coluna em array NumPy: numérico quando possível
+        (float se houver nulos), senão array de objetos.
+        """
+        if values and all(isinstance(v, (int, float)) or v is None for v in values):
+            if any(v is None for v in values):
+                return np.array(values, dtype=float)
+            return np.array(values)
+        return np.array(values, dtype=object)
 
 
     def fetch_all(self, query: str, params: tuple = None):
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                if params:
-                    self.logger.debug(f"Executando query: {query} com parâmetros: {params}")
-                    cursor.execute(query, params)
-                else:
-                    self.logger.debug(f"Executando query: {query}")
-                    cursor.execute(query)
+                self.logger.debug("Executando query: %s com parâmetros: %s", query, params)
+                start = time.perf_counter()
+                cursor.execute(query, params or ())
                 results = cursor.fetchall()
                 cursor.close()  # ✅ Fecha cursor antes de sair
-                self.logger.debug(f"Retornados {len(results)} registros.")
+                self._record(query, time.perf_counter() - start, len(results))
                 return results
             except sqlite3.Error as e:
-                self.logger.error(f"Erro na execução da query: {e}\nQuery: {query}\nParâmetros: {params}")
+                self.logger.error("Erro na execução da query: %s\nQuery: %s\nParâmetros: %s", e, query, params)
                 raise
 
     def fetch_one(self, query: str, params: tuple = None):
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                if params:
-                    self.logger.debug(f"Executando query: {query} com parâmetros: {params}")
-                    cursor.execute(query, params)
-                else:
-                    self.logger.debug(f"Executando query: {query}")
-                    cursor.execute(query)
+                self.logger.debug("Executando query: %s com parâmetros: %s", query, params)
+                start = time.perf_counter()
+                cursor.execute(query, params or ())
                 result = cursor.fetchone()
                 cursor.close()  # ✅ Fecha cursor antes de sair
-                self.logger.debug("Retornado um registro." if result else "Nenhum registro encontrado.")
+                self._record(query, time.perf_counter() - start, 1 if result else 0)
                 return result
             except sqlite3.Error as e:
-                self.logger.error(f"Erro na execução da query: {e}\nQuery: {query}\nParâmetros: {params}")
+                self.logger.error("Erro na execução da query: %s\nQuery: %s\nParâmetros: %s", e, query, params)
                 raise
 
+    def _record(self, query: str, elapsed: float, rows: int):
+        """
+        Acumula tempo e linhas da consulta e registra as consultas lentas.
+        A chave normalizada fica em cache por texto; a mensagem de log só é formatada quando emitida.
+        """
+        key = _normalize(query)
+        with self._stats_lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {"execucoes": 0, "tempo_total": 0.0, "tempo_max": 0.0, "linhas": 0}
+                if len(self._stats) > self.max_stats_entries:
+                    self._stats.popitem(last=False)
+            else:
+                self._stats.move_to_end(key)
+            stats["execucoes"] += 1
+            stats["tempo_total"] += elapsed
+            stats["tempo_max"] = max(stats["tempo_max"], elapsed)
+            stats["linhas"] += rows
+        if elapsed >= self.slow_query_seconds:
+            self.logger.warning("Consulta lenta (%.3fs, %d linhas): %s", elapsed, rows, _compact(query))
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Consulta executada em %.4fs (%d linhas): %s", elapsed, rows, _compact(query))
+
+    def query_stats(self) -> List[Dict]:
+        """
+        Estatísticas acumuladas por consulta desde a criação (ou desde reset_stats). Consultas que
+        só diferem nos literais são somadas, com os literais trocados por ?; ao passar de
+        max_stats_entries, a consulta usada há mais tempo é descartada.
+
+        :return: Lista de dicionários com consulta, execucoes, tempo_total, tempo_medio, tempo_max
+                 e linhas (total), das consultas de maior tempo total primeiro.
+        """
+        with self._stats_lock:
+            items = [(query, dict(stats)) for query, stats in self._stats.items()]
+        result = [
+            {"consulta": query, **stats, "tempo_medio": stats["tempo_total"] / stats["execucoes"]}
+            for query, stats in items
+        ]
+        return sorted(result, key=lambda stats: stats["tempo_total"], reverse=True)
+
+    def reset_stats(self):
+        """
+        Zera as estatísticas de consultas.
+        """
+        with self._stats_lock:
+            self._stats.clear()
+
     def get_date_defaults(self):
         """
         Recupera as datas mínimas e máximas (data_referencia e data_processamento)
         combinadas de todas as tabelas de fato (fato_custo, fato_combustivel, fato_manutencao, fato_reforma, fato_uso).
 
+        Lê a tabela meta_fatos mantida pelo ETL (uma linha por tabela de fatos); em bancos
+        sem ela, ou com metadados incompletos, calcula MIN/MAX tabela a tabela.
+
         :return: Objeto sqlite3.Row contendo min_data_referencia, max_data_referencia,
                  min_data_processamento e max_data_processamento.
         """
-        query = """
-            SELECT MIN(data_referencia) AS min_data_referencia, 
-                   MAX(data_referencia) AS max_data_referencia, 
-                   MIN(data_processamento) AS min_data_processamento, 
-                   MAX(data_processamento) AS max_data_processamento
-            FROM (
-                SELECT data_referencia, data_processamento FROM fato_custo
-                UNION ALL
-                SELECT data_referencia, data_processamento FROM fato_combustivel
-                UNION ALL
-                SELECT data_referencia, data_processamento FROM fato_manutencao
-                UNION ALL
-                SELECT data_referencia, data_processamento FROM fato_reforma
-                UNION ALL
-                SELECT data_referencia, data_processamento FROM fato_uso
-            )
-        """
-        result = self.fetch_one(query)
+        possui_meta = self.fetch_one(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta_fatos'"
+        )
+        if possui_meta:
+            result = self.fetch_one(DATE_BOUNDS_META_QUERY)
+            if result["tabelas"] >= len(FACT_TABLES):
+                self.logger.debug("Datas padrão recuperadas de meta_fatos.")
+                return result
+        result = self.fetch_one(DATE_BOUNDS_FALLBACK_QUERY)
         self.logger.debug("Datas padrão recuperadas com sucesso.")
         return result
 
+    def describe_schema(self) -> str:
+        """
+        Descreve as tabelas do banco (dim_equipamento e fato_*) com suas colunas e tipos,
+        lidos do próprio SQLite, no formato usado nos prompts de texto para SQL.
+
+        :return: Uma linha por tabela, seguida dos relacionamentos.
+        """
+        tabelas = self.fetch_all(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND (name = 'dim_equipamento' OR name LIKE 'fato\\_%' ESCAPE '\\') ORDER BY name"
+        )
+        linhas = []
+        for tabela in tabelas:
+            colunas = self.fetch_all("SELECT name, type FROM pragma_table_info(?)", (tabela["name"],))
+            descricao = ", ".join(f"{c['name']} {c['type']}".strip() for c in colunas)
+            linhas.append(f"{tabela['name']}({descricao})")
+        linhas.append(
+            "Relacionamentos: fato_*.id_equipamento -> dim_equipamento.id_equipamento; "
+            "datas em texto ISO (AAAA-MM-DD); data_referencia é o mês de competência."
+        )
+        return "\n".join(linhas)
+
 # Caso haja a necessidade de implementar métodos adicionais, como inserções, atualizações ou consultas específicas,
 # eles podem ser adicionados abaixo com o mesmo padrão de tratamento, logging e uso de parâmetros.
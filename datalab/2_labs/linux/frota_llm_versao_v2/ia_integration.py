@@ -0,0 +1,207 @@
+import os
+import re
+import logging
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional
+
+from db import Database
+
+# Função de completude: recebe as mensagens do chat e devolve o texto da resposta
+Completion = Callable[[List[Dict[str, str]]], str]
+
+SQL_SYSTEM_PROMPT = """
+Você é um especialista em gestão de frota agrícola e em SQLite.
+Escreva UMA consulta SELECT que responda à pergunta do usuário usando apenas as tabelas abaixo.
+
+Regras:
+- Apenas SELECT (pode começar com WITH), uma única instrução.
+- Prefira agregações (SUM, AVG, COUNT, GROUP BY) a listar registros.
+- Use os nomes de tabelas e colunas exatamente como descritos.
+- Responda somente com a consulta, dentro de um bloco ```sql```.
+
+Esquema:
+{schema}
+""".strip()
+
+ANSWER_SYSTEM_PROMPT = """
+Você é um especialista em gestão de frota agrícola, focado em análise operacional e financeira.
+Responda à pergunta do usuário com base apenas no resultado da consulta fornecido.
+Utilize regras de arredondamento apropriadas e mantenha consistência em tabelas e formatação numérica.
+""".strip()
+
+
+class AIIntegration:
+    """
+    Integração com a API de IA no modo texto para SQL.
+
+    Em vez de enviar os registros filtrados no prompt, o modelo recebe o esquema do banco
+    (Database.describe_schema) e devolve uma consulta SELECT. A consulta é validada, executada
+    por Database.execute_query (somente leitura, com limites de tempo e de linhas) e apenas o resultado, pequeno e
+    agregado, volta ao modelo para a resposta final. O custo de cada pergunta não depende
+    da quantidade de registros selecionados.
+    """
+
+    def __init__(self, db: Database, completion: Optional[Completion] = None,
+                 model_name: str = "deepseek-r1-distill-llama-70b", max_result_rows: int = 50,
+                 max_attempts: int = 2):
+        """
+        Inicializa a integração.
+
+        :param db: Banco de dados usado para o esquema e a execução das consultas.
+        :param completion: Função de completude; por padrão usa o cliente Groq (GROQ_API_KEY).
+        :param model_name: Nome do modelo usado pelo cliente Groq padrão.
+        :param max_result_rows: Máximo de linhas do resultado enviadas ao modelo.
+        :param max_attempts: Tentativas de gerar uma consulta válida (o erro volta ao modelo).
+        """
+        self.db = db
+        self.model_name = model_name
+        self.max_result_rows = max_result_rows
+        self.max_attempts = max_attempts
+        self.completion = completion or self._groq_completion
+        self.logger = logging.getLogger(__name__)
+        self._client = None
+        self._schema = None
+
+    def _groq_completion(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Completude padrão via Groq; o cliente é criado na primeira chamada.
+        """
+        if self._client is None:
+            api_key = os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("Chave de API não encontrada na variável de ambiente 'GROQ_API_KEY'.")
+            from groq import Groq
+            self._client = Groq(api_key=api_key)
+        chat_completion = self._client.chat.completions.create(messages=messages, model=self.model_name)
+        return chat_completion.choices[0].message.content
+
+    @property
+    def schema(self) -> str:
+        """Descrição do esquema, lida do banco uma única vez."""
+        if self._schema is None:
+            self._schema = self.db.describe_schema()
+        return self._schema
+
+    def build_sql_prompt(self, question: str, error: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Monta as mensagens que pedem ao modelo a consulta SQL.
+
+        :param question: Pergunta do usuário.
+        :param error: Erro da tentativa anterior, para o modelo corrigir a consulta.
+        :return: Lista de mensagens do chat.
+        """
+        messages = [
+            {"role": "system", "content": SQL_SYSTEM_PROMPT.format(schema=self.schema)},
+            {"role": "user", "content": question},
+        ]
+        if error:
+            messages.append({"role": "user", "content": f"A consulta anterior falhou: {error}. Corrija-a."})
+        return messages
+
+    @staticmethod
+    def clean_response(response: str) -> str:
+        """
+        Remove os blocos <think>...</think> da resposta.
+
+        :param response: Resposta bruta da API.
+        :return: Resposta limpa.
+        """
+        return re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL).strip()
+
+    def extract_sql(self, response: str) -> str:
+        """
+        Extrai a consulta da resposta do modelo (bloco ```sql``` ou texto puro).
+
+        :param response: Resposta bruta da API.
+        :return: Consulta sem ponto e vírgula final.
+        """
+        text = self.clean_response(response)
+        bloco = re.search(r'```(?:sql)?\s*(.*?)```', text, flags=re.DOTALL | re.IGNORECASE)
+        if bloco:
+            text = bloco.group(1)
+        return text.strip().rstrip(';').strip()
+
+    def validate_sql(self, sql: str) -> str:
+        """
+        Valida a consulta gerada. Mais de uma instrução é recusada pelo próprio sqlite3
+        na execução e o autorizador de Database bloqueia qualquer operação que não seja leitura.
+
+        :param sql: Consulta extraída da resposta.
+        :return: Consulta pronta para Database.execute_query.
+        :raises PermissionError: Se não começar com SELECT ou WITH.
+        """
+        if not sql.lower().startswith(("select", "with")):
+            raise PermissionError("A consulta gerada não é um SELECT.")
+        return sql
+
+    def run_sql(self, question: str) -> Dict[str, Any]:
+        """
+        Pede a consulta ao modelo, valida e executa; em caso de erro, devolve o erro ao
+        modelo e tenta de novo até max_attempts.
+
+        :param question: Pergunta do usuário.
+        :return: Dicionário com sql, colunas, linhas e truncado.
+        """
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            sql = self.extract_sql(self.completion(self.build_sql_prompt(question, error)))
+            self.logger.debug("Consulta gerada (tentativa %d): %s", attempt, sql)
+            try:
+                # Uma linha além do limite indica que o resultado foi truncado
+                rows = self.db.execute_query(self.validate_sql(sql), (), max_rows=self.max_result_rows + 1)
+            except (PermissionError, TimeoutError, sqlite3.Error) as e:
+                error = str(e)
+                self.logger.warning("Consulta gerada rejeitada (tentativa %d): %s", attempt, error)
+                continue
+            columns = list(rows[0].keys()) if rows else []
+            return {
+                "sql": sql,
+                "colunas": columns,
+                "linhas": [tuple(row) for row in rows[:self.max_result_rows]],
+                "truncado": len(rows) > self.max_result_rows,
+            }
+        raise ValueError(f"Não foi possível gerar uma consulta válida: {error}")
+
+    def build_answer_prompt(self, question: str, result: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Monta as mensagens da resposta final com o resultado da consulta em CSV.
+
+        :param question: Pergunta do usuário.
+        :param result: Resultado de run_sql.
+        :return: Lista de mensagens do chat.
+        """
+        linhas = [",".join(result["colunas"])]
+        linhas += [",".join("" if v is None else str(v) for v in row) for row in result["linhas"]]
+        aviso = f"\n(resultado truncado em {self.max_result_rows} linhas)" if result["truncado"] else ""
+        content = (
+            f"Pergunta: {question}\n\nConsulta executada:\n{result['sql']}\n\n"
+            f"Resultado:\n" + "\n".join(linhas) + aviso
+        )
+        return [
+            {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
+            {"role": "user", "content": content},
+        ]
+
+    def query(self, question: str) -> Dict[str, Any]:
+        """
+        Responde à pergunta no modo texto para SQL.
+
+        :param question: Pergunta do usuário.
+        :return: Dicionário com sql, colunas, linhas, truncado e resposta (limpa).
+        """
+        try:
+            result = self.run_sql(question)
+            response = self.completion(self.build_answer_prompt(question, result))
+            result["resposta"] = self.clean_response(response)
+            return result
+        except Exception as e:
+            self.logger.error("Erro ao consultar a API de IA: %s", e)
+            raise
+
+
+# Exemplo de uso:
+if __name__ == "__main__":
+    ai_integration = AIIntegration(Database("frota.db"))
+    resultado = ai_integration.query("Qual classe de equipamento teve o maior total realizado?")
+    print("Consulta:", resultado["sql"])
+    print("Resposta da IA:", resultado["resposta"])
@@ -39,5 +39,96 @@ class TestDatabase(unittest.TestCase):
         with self.assertRaises(PermissionError):  # Deve lançar um erro de permissão
             self.db.execute_query(query, params)
 
+    def test_unauthorized_operation_blocked(self):
+        """ Testa se o autorizador bloqueia operações que não são leitura, mesmo começando com SELECT. """
+        with self.assertRaises(PermissionError):
+            self.db.execute_query("SELECT * FROM pragma_table_info('dim_equipamento')", ())
+
+    def test_runaway_query_timeout(self):
+        """ Testa se uma consulta que não termina é interrompida pelo limite de tempo. """
+        db = Database(self.db_path, timeout_seconds=0.2)
+        query = "SELECT COUNT(*) FROM (WITH RECURSIVE r(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM r) SELECT n FROM r)"
+        with self.assertRaises(TimeoutError):
+            db.execute_query(query, ())
+
+    def test_row_cap(self):
+        """ Testa se o resultado é limitado a max_rows. """
+        db = Database(self.db_path, max_rows=7)
+        self.assertEqual(len(db.execute_query("SELECT * FROM fato_custo", ())), 7)
+        self.assertEqual(len(db.execute_query("SELECT * FROM fato_custo", (), max_rows=3)), 3)
+
+    def test_iter_query_chunks(self):
+        """ Testa se iter_query entrega todas as linhas em blocos de até chunk_size. """
+        total = len(self.db.execute_query("SELECT id FROM fato_custo", ()))
+        chunks = list(self.db.iter_query("SELECT id FROM fato_custo", (), chunk_size=100))
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), total)
+
+    def test_iter_query_blocked(self):
+        """ Testa se iter_query também bloqueia o que não é leitura. """
+        with self.assertRaises(PermissionError):
+            list(self.db.iter_query("DELETE FROM dim_equipamento"))
+
+    def test_fetch_columns(self):
+        """ Testa o retorno colunar: um array por coluna, com o mesmo número de linhas. """
+        columns = self.db.fetch_columns("SELECT id, total_realizado FROM fato_custo", chunk_size=64)
+        rows = self.db.execute_query("SELECT id, total_realizado FROM fato_custo", ())
+        self.assertEqual(list(columns), ["id", "total_realizado"])
+        self.assertEqual(len(columns["id"]), len(rows))
+        self.assertEqual(columns["id"].tolist(), [row["id"] for row in rows])
+
+    def test_query_stats(self):
+        """ Testa se as consultas são contadas por texto, com tempo e linhas. """
+        db = Database(self.db_path)
+        for _ in range(3):
+            db.execute_query("SELECT * FROM dim_equipamento", ())
+        db.fetch_one("SELECT COUNT(*) FROM fato_custo")
+        stats = {s["consulta"]: s for s in db.query_stats()}
+        self.assertEqual(stats["SELECT * FROM dim_equipamento"]["execucoes"], 3)
+        self.assertEqual(stats["SELECT COUNT(*) FROM fato_custo"]["linhas"], 1)
+        db.reset_stats()
+        self.assertEqual(db.query_stats(), [])
+
+    def test_query_stats_bounded(self):
+        """ Testa se literais diferentes somam na mesma consulta e se o total de consultas é limitado. """
+        db = Database(self.db_path, max_stats_entries=3)
+        for i in range(50):
+            db.execute_query(f"SELECT id FROM fato_custo WHERE id = {i} AND 'x{i}' <> ''", ())
+        stats = {s["consulta"]: s for s in db.query_stats()}
+        self.assertEqual(stats["SELECT id FROM fato_custo WHERE id = ? AND ? <> ?"]["execucoes"], 50)
+        for i in range(10):
+            db.execute_query(f"SELECT {', '.join(['id'] * (i + 1))} FROM fato_custo LIMIT 1", ())
+        self.assertEqual(len(db.query_stats()), 3)
+
+    def test_slow_query_logged(self):
+        """ Testa se consultas acima do limite são registradas como lentas. """
+        db = Database(self.db_path, slow_query_seconds=0)
+        with self.assertLogs("db", level="WARNING") as logs:
+            db.fetch_all("SELECT id FROM fato_uso")
+        self.assertIn("Consulta lenta", logs.output[0])
+
+    def test_date_defaults(self):
+        """ Testa se os limites de data coincidem com o MIN/MAX sobre todas as tabelas de fatos. """
+        union = " UNION ALL ".join(
+            f"SELECT data_referencia, data_processamento FROM {t}"
+            for t in ("fato_custo", "fato_combustivel", "fato_manutencao", "fato_reforma", "fato_uso")
+        )
+        expected = self.db.fetch_one(
+            "SELECT MIN(data_referencia), MAX(data_referencia), MIN(data_processamento), MAX(data_processamento) "
+            f"FROM ({union})"
+        )
+        result = self.db.get_date_defaults()
+        self.assertEqual(
+            (result["min_data_referencia"], result["max_data_referencia"],
+             result["min_data_processamento"], result["max_data_processamento"]),
+            tuple(expected),
+        )
+
+    def test_with_write_blocked(self):
+        """ Testa se um WITH seguido de escrita é bloqueado pelo autorizador. """
+        query = "WITH x AS (SELECT 1) DELETE FROM dim_equipamento WHERE id_equipamento IN (SELECT * FROM x)"
+        with self.assertRaises(PermissionError):
+            self.db.execute_query(query, ())
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from db import Database
+from ia_integration import AIIntegration
+
+class FakeCompletion:
+    """ Completude simulada: devolve as respostas na ordem e guarda as mensagens recebidas. """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, messages):
+        self.calls.append(messages)
+        return self.responses.pop(0)
+
+class TestAIIntegration(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """ Usa o banco de exemplo em modo somente leitura. """
+        cls.db = Database("frota.db")
+
+    def test_schema_in_prompt(self):
+        """ Testa se o prompt de SQL traz as tabelas do esquema. """
+        ai = AIIntegration(self.db, completion=FakeCompletion())
+        prompt = ai.build_sql_prompt("Qual o total realizado?")[0]["content"]
+        self.assertIn("fato_custo(", prompt)
+        self.assertIn("dim_equipamento(", prompt)
+
+    def test_query_sends_only_result(self):
+        """ Testa o fluxo completo: a resposta final recebe só o resultado agregado. """
+        fake = FakeCompletion(
+            "<think>somar por classe</think>```sql\n"
+            "SELECT de.classe, SUM(fc.total_realizado) AS total FROM fato_custo fc "
+            "JOIN dim_equipamento de ON de.id_equipamento = fc.id_equipamento GROUP BY de.classe;\n```",
+            "<think>ok</think>A classe com maior total é X.",
+        )
+        result = AIIntegration(self.db, completion=fake).query("Total por classe?")
+        self.assertEqual(result["colunas"], ["classe", "total"])
+        self.assertEqual(result["resposta"], "A classe com maior total é X.")
+        classes = self.db.execute_query("SELECT COUNT(DISTINCT classe) FROM dim_equipamento", ())[0][0]
+        self.assertEqual(len(result["linhas"]), min(classes, 50))
+        self.assertIn("Resultado:\nclasse,total", fake.calls[1][1]["content"])
+
+    def test_non_select_is_retried(self):
+        """ Testa se uma instrução que não é SELECT é rejeitada e o erro volta ao modelo. """
+        fake = FakeCompletion(
+            "DELETE FROM dim_equipamento",
+            "SELECT COUNT(*) AS n FROM fato_custo",
+            "Há registros.",
+        )
+        result = AIIntegration(self.db, completion=fake).query("Quantos registros?")
+        self.assertEqual(result["colunas"], ["n"])
+        self.assertIn("falhou", fake.calls[1][-1]["content"])
+
+    def test_result_is_truncated(self):
+        """ Testa se o resultado enviado ao modelo respeita max_result_rows. """
+        fake = FakeCompletion("SELECT id FROM fato_custo", "ok")
+        result = AIIntegration(self.db, completion=fake, max_result_rows=5).query("Liste os ids")
+        self.assertEqual(len(result["linhas"]), 5)
+        self.assertTrue(result["truncado"])
+
+    def test_cte_and_semicolon_literal(self):
+        """ Testa se consultas com WITH e literais com ponto e vírgula são aceitas. """
+        fake = FakeCompletion(
+            "WITH t AS (SELECT classe FROM dim_equipamento) SELECT COUNT(*) AS n, 'a;b' AS s FROM t",
+            "ok",
+        )
+        result = AIIntegration(self.db, completion=fake).query("Quantos equipamentos?")
+        self.assertEqual(result["colunas"], ["n", "s"])
+        self.assertEqual(result["linhas"][0][1], "a;b")
+
+    def test_multiple_statements_retried(self):
+        """ Testa se mais de uma instrução é recusada na execução e o erro volta ao modelo. """
+        fake = FakeCompletion(
+            "SELECT 1; DELETE FROM dim_equipamento",
+            "SELECT 1 AS um",
+            "ok",
+        )
+        result = AIIntegration(self.db, completion=fake).query("Teste")
+        self.assertEqual(result["colunas"], ["um"])
+        self.assertIn("falhou", fake.calls[1][-1]["content"])
+
+if __name__ == "__main__":
+    unittest.main()